@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -36,4 +38,12 @@ assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts'])
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
+    'tests.fixtures.fixture_queries',
 ]
+
+
+@pytest.fixture(autouse=True)
+def sync_thumbnails(settings):
+    # Варианты изображений создаются сразу, а не в фоновом пуле:
+    # временный MEDIA_ROOT теста удаляется раньше, чем пул до него дойдет.
+    settings.THUMBNAIL_WORKERS = 0
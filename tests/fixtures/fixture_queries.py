@@ -0,0 +1,25 @@
+import pytest
+
+from core.queries import query_budget as _query_budget
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        'allow_repeated_queries: не проверять запросы теста на N+1'
+    )
+
+
+@pytest.fixture(autouse=True)
+def detect_repeated_queries(request, settings):
+    # Запрос с N+1 завершается NPlusOneError со строкой шаблона и стеком.
+    if request.node.get_closest_marker('allow_repeated_queries'):
+        settings.QUERY_DETECTOR_MODE = 'off'
+    else:
+        settings.QUERY_DETECTOR_MODE = 'raise'
+
+
+@pytest.fixture
+def query_budget():
+    """with query_budget(8): client.get(url) - не больше 8 запросов и без N+1."""
+    return _query_budget
@@ -0,0 +1,47 @@
+import pytest
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+POSTS_NUM = 12
+
+
+@pytest.fixture
+def feed(user, mixer):
+    group = Group.objects.create(
+        title='Тестовая группа', slug='budget', description='Описание'
+    )
+    authors = mixer.cycle(POSTS_NUM).blend('auth.User')
+    for number, author in enumerate(authors):
+        Follow.objects.create(user=user, author=author)
+        post = Post.objects.create(
+            text=f'Пост {number}', author=author,
+            group=group if number % 2 else None
+        )
+        Comment.objects.create(post=post, author=authors[-1 - number], text='-')
+    return group, authors, post
+
+
+@pytest.mark.django_db
+class TestQueryBudget:
+    # Сессия, пользователь и счетчики входят в бюджет; главное, чтобы
+    # число запросов не росло с числом постов и комментариев.
+    @pytest.mark.parametrize('name, budget', [
+        ('index', 4),
+        ('group_list', 5),
+        ('profile', 7),
+        ('post_detail', 7),
+        ('follow_index', 6),
+    ])
+    def test_view_budget(self, user_client, feed, query_budget, name, budget):
+        group, authors, post = feed
+        args = {
+            'group_list': (group.slug,),
+            'profile': (authors[0].username,),
+            'post_detail': (post.pk,),
+        }.get(name, ())
+        with query_budget(budget):
+            response = user_client.get(reverse(f'posts:{name}', args=args))
+        assert response.status_code == 200, (
+            f'Страница `{name}` должна открываться'
+        )
@@ -0,0 +1,61 @@
+"""Представление объектов в JSON API.
+
+Вложенные автор и группа берутся из полей, которые уже выбраны
+запросами лент (for_feed), поэтому сериализация не делает запросов.
+"""
+
+
+def user_data(user) -> dict:
+    return {
+        'id': user.pk,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+    }
+
+
+def group_data(group) -> dict:
+    return {'id': group.pk, 'slug': group.slug, 'title': group.title}
+
+
+def group_detail_data(group, posts_count) -> dict:
+    return {
+        **group_data(group),
+        'description': group.description,
+        'posts_count': posts_count,
+    }
+
+
+def post_data(post) -> dict:
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'image': post.image.url if post.image else None,
+        'author': user_data(post.author),
+        'group': group_data(post.group) if post.group_id else None,
+    }
+
+
+def comment_data(comment) -> dict:
+    return {
+        'id': comment.pk,
+        'text': comment.text,
+        'pub_date': comment.pub_date.isoformat(),
+        'author': user_data(comment.author),
+    }
+
+
+def follow_data(follow) -> dict:
+    return {
+        'id': follow.pk,
+        'pub_date': follow.pub_date.isoformat(),
+        'author': user_data(follow.author),
+    }
+
+
+def sparse(data, fields) -> dict:
+    """Только поля из ?fields= (все, если список пуст)."""
+    if not fields:
+        return data
+    return {name: value for name, value in data.items() if name in fields}
@@ -0,0 +1,169 @@
+import gzip
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core import queries
+from posts.models import Comment, Follow, Group, Post
+from posts.views import COMMENTS_COUNT, POSTS_COUNT
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=cls.author,
+                group=cls.group if number % 2 else None
+            )
+            for number in range(POSTS_COUNT + 3)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_posts_cursor_pages(self):
+        """Курсор next проходит ленту без пропусков и повторов"""
+        url, texts = reverse('api:posts'), []
+        while url:
+            data = self.guest.get(url).json()
+            texts += [post['text'] for post in data['results']]
+            url = data['next']
+        self.assertEqual(
+            texts, [post.text for post in reversed(self.posts)]
+        )
+
+    def test_comments_previous_link(self):
+        """Ссылка previous комментариев ведет на предыдущую страницу"""
+        post = self.posts[1]
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.reader, text=f'Комментарий {n}')
+            for n in range(COMMENTS_COUNT * 2 + 5)
+        )
+        url = reverse('api:comments', args=(post.pk,))
+        second = self.guest.get(self.guest.get(url).json()['next']).json()
+        third = self.guest.get(second['next']).json()
+        previous = self.guest.get(third['previous']).json()
+        self.assertEqual(previous['results'], second['results'])
+        self.assertEqual(previous['next'], second['next'])
+
+    def test_post_embeds_author_and_group(self):
+        post = self.posts[1]
+        data = self.guest.get(reverse('api:post', args=(post.pk,))).json()
+        self.assertEqual(data['author']['last_name'], 'Толстой')
+        self.assertEqual(data['group']['slug'], 'test-slug')
+
+    def test_bounded_queries(self):
+        """Вложенные объекты не порождают запрос на каждую запись"""
+        query_budget = {
+            reverse('api:posts'): 1,
+            reverse('api:comments', args=(self.posts[0].pk,)): 2,
+            reverse('api:groups'): 2,
+        }
+        for url, budget in query_budget.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    self.guest.get(url)
+
+    def test_follows_without_n_plus_one(self):
+        """Список подписок не читает подписчика у каждой строки"""
+        for number in range(3):
+            Follow.objects.create(
+                user=self.reader,
+                author=User.objects.create_user(username=f'author_{number}')
+            )
+        with queries.query_budget():
+            data = self.reader_client.get(reverse('api:follows')).json()
+        self.assertEqual(len(data['results']), 4)
+
+    def test_sparse_fields(self):
+        data = self.guest.get(
+            reverse('api:posts'), {'fields': 'id,author'}
+        ).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'author'})
+        self.assertIn('fields=id%2Cauthor', data['next'])
+
+    def test_filters_and_groups(self):
+        data = self.guest.get(
+            reverse('api:posts'), {'group': 'test-slug'}
+        ).json()
+        self.assertTrue(all(
+            post['group']['slug'] == 'test-slug' for post in data['results']
+        ))
+        group = self.guest.get(reverse('api:group', args=('test-slug',)))
+        self.assertEqual(group.json()['posts_count'], 6)
+        missing = self.guest.get(reverse('api:group', args=('missing',)))
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(missing['Content-Type'], 'application/json')
+
+    def test_follows_and_feed_require_login(self):
+        for name in ('api:follows', 'api:feed'):
+            with self.subTest(name=name):
+                response = self.guest.get(reverse(name))
+                self.assertEqual(response.status_code, 401)
+        follows = self.reader_client.get(reverse('api:follows')).json()
+        self.assertEqual(
+            follows['results'][0]['author']['username'], 'author'
+        )
+        feed = self.reader_client.get(reverse('api:feed')).json()
+        self.assertEqual(len(feed['results']), POSTS_COUNT)
+
+    def test_gzip(self):
+        response = self.guest.get(
+            reverse('api:posts'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data['results']), POSTS_COUNT)
+
+    def test_export_streams_ndjson_and_csv(self):
+        """Выгрузка доступна только персоналу, since отсекает старые строки"""
+        url = reverse('api:export', args=('posts',))
+        self.assertEqual(self.guest.get(url).status_code, 401)
+        self.assertEqual(self.reader_client.get(url).status_code, 403)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        client = Client()
+        client.force_login(staff)
+        response = client.get(url, {'since': self.posts[-3].pk})
+        self.assertTrue(response.streaming)
+        rows = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [row['id'] for row in rows],
+            [post.pk for post in self.posts[-2:]]
+        )
+        self.assertEqual(rows[-1]['text'], self.posts[-1].text)
+        self.assertEqual(
+            rows[-1]['pub_date'], self.posts[-1].pub_date.isoformat()
+        )
+        response = client.get(
+            reverse('api:export', args=('comments',)), {'format': 'csv'}
+        )
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,pub_date,post_id,author_id,text')
+        self.assertTrue(lines[1].endswith(',Комментарий'))
@@ -0,0 +1,22 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('v1/posts/', views.posts_list, name='posts'),
+    path('v1/posts/<int:post_id>/', views.post_detail, name='post'),
+    path(
+        'v1/posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='comments'
+    ),
+    path('v1/groups/', views.groups_list, name='groups'),
+    path('v1/groups/<slug:slug>/', views.group_detail, name='group'),
+    path('v1/follows/', views.follows_list, name='follows'),
+    path('v1/feed/', views.feed, name='feed'),
+    path(
+        'v1/export/<slug:kind>/', views.export_content, name='export'
+    ),
+]
@@ -0,0 +1,207 @@
+"""JSON API v1: посты, группы, комментарии и подписки.
+
+Списки строятся теми же запросами и тем же постраничным выводом по
+курсору, что и HTML-ленты (for_feed, get_page, comment_page,
+timeline.feed_page), поэтому API и страницы не расходятся.
+"""
+from functools import wraps
+
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from core.paginator import get_page
+from posts import counters, export, lookups, timeline
+from posts.models import Group, Post
+from posts.views import POSTS_COUNT, comment_page
+
+from . import serializers
+
+PAGE_PARAMS = ('after', 'before', 'page')
+PAGE_SIZE: int = 20  # групп и подписок на странице
+
+
+def api_view(view_func):
+    """Только GET, ответ сжимается gzip, ошибки 404 - в JSON."""
+    @gzip_page
+    @require_GET
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse({'detail': 'Не найдено'}, status=404)
+    return wrapper
+
+
+def login_required(view_func):
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Требуется авторизация'}, status=401
+            )
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def staff_required(view_func):
+    @login_required
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_staff:
+            return JsonResponse({'detail': 'Доступ запрещен'}, status=403)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def requested_fields(request) -> set:
+    fields = request.GET.get('fields', '')
+    return {name.strip() for name in fields.split(',') if name.strip()}
+
+
+def page_url(request, **params):
+    """Адрес соседней страницы с теми же параметрами запроса."""
+    query = request.GET.copy()
+    for name in PAGE_PARAMS:
+        query.pop(name, None)
+    query.update(params)
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def page_response(request, page, serialize):
+    if getattr(page, 'is_cursor', False):
+        next_url = page.next_cursor and page_url(
+            request, after=page.next_cursor
+        )
+        previous_url = page.previous_cursor and page_url(
+            request, before=page.previous_cursor
+        )
+    else:
+        next_url = page.has_next() and page_url(
+            request, page=page.next_page_number()
+        )
+        previous_url = page.has_previous() and page_url(
+            request, page=page.previous_page_number()
+        )
+    fields = requested_fields(request)
+    return JsonResponse({
+        'results': [
+            serializers.sparse(serialize(obj), fields) for obj in page
+        ],
+        'next': next_url or None,
+        'previous': previous_url or None,
+    })
+
+
+def object_response(request, data):
+    return JsonResponse(serializers.sparse(data, requested_fields(request)))
+
+
+@api_view
+def posts_list(request):
+    """Лента постов, фильтры ?group=<slug> и ?author=<username>."""
+    posts = Post.objects.all()
+    if 'group' in request.GET:
+        posts = lookups.group_or_404(request.GET['group']).posts.all()
+    if 'author' in request.GET:
+        author = lookups.user_or_404(request.GET['author'])
+        posts = posts.filter(author=author)
+    page = get_page(request, posts.for_feed(), POSTS_COUNT)
+    return page_response(request, page, serializers.post_data)
+
+
+@api_view
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
+    return object_response(request, serializers.post_data(post))
+
+
+@api_view
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    page = comment_page(request, post)
+    return page_response(request, page, serializers.comment_data)
+
+
+@api_view
+def groups_list(request):
+    """Группы по возрастанию id, следующая страница - ?after=<id>."""
+    groups = Group.objects.order_by('pk')
+    try:
+        groups = groups.filter(pk__gt=int(request.GET.get('after', 0)))
+    except ValueError:
+        pass
+    groups = list(groups[:PAGE_SIZE + 1])
+    has_next = len(groups) > PAGE_SIZE
+    groups = groups[:PAGE_SIZE]
+    posts_counts = counters.get('group.posts', [group.pk for group in groups])
+    fields = requested_fields(request)
+    return JsonResponse({
+        'results': [
+            serializers.sparse(
+                serializers.group_detail_data(group, posts_counts[group.pk]),
+                fields
+            )
+            for group in groups
+        ],
+        'next': page_url(request, after=groups[-1].pk) if has_next else None,
+        'previous': None,
+    })
+
+
+@api_view
+def group_detail(request, slug):
+    group = lookups.group_or_404(slug)
+    posts_count = counters.of('group', group.pk)['posts']
+    return object_response(
+        request, serializers.group_detail_data(group, posts_count)
+    )
+
+
+@api_view
+@login_required
+def follows_list(request):
+    """Авторы, на которых подписан пользователь, от новых подписок."""
+    # user - тоже: менеджер request.user.follower читает его у каждой
+    # строки, и отложенное поле стоило бы запроса на подписку.
+    follows = request.user.follower.select_related('author').only(
+        'pub_date', 'user', 'author', 'author__username',
+        'author__first_name', 'author__last_name',
+    )
+    page = get_page(request, follows, PAGE_SIZE)
+    return page_response(request, page, serializers.follow_data)
+
+
+@api_view
+@login_required
+def feed(request):
+    """Лента подписок пользователя."""
+    page = timeline.feed_page(request, request.user, POSTS_COUNT)
+    return page_response(request, page, serializers.post_data)
+
+
+@api_view
+@staff_required
+def export_content(request, kind):
+    """Потоковая выгрузка ?format=ndjson|csv, ?since=<id> - только новые."""
+    if kind not in export.EXPORTS:
+        raise Http404
+    format_ = request.GET.get('format', 'ndjson')
+    if format_ not in export.FORMATS:
+        return JsonResponse(
+            {'detail': f'Формат: {", ".join(export.FORMATS)}'}, status=400
+        )
+    try:
+        since = int(request.GET.get('since', 0))
+    except ValueError:
+        since = 0
+    response = StreamingHttpResponse(
+        export.export(kind, format_, since),
+        content_type=f'{export.CONTENT_TYPES[format_]}; charset=utf-8'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{kind}.{format_}"'
+    )
+    return response
@@ -0,0 +1,194 @@
+"""Кэширование страниц с инвалидацией по тегам.
+
+Для каждого тега в кэше хранится номер версии. Ключ кэшированной
+страницы включает версии ее тегов, поэтому после bump() старые записи
+больше не находятся и вытесняются сами по истечении TTL.
+
+Персональные части страницы (шапка, переключатель лент) выводятся тегом
+{% personal %}: в общий кэш попадает страница с метками, а метки
+заполняются для каждого запроса (with_personal_fragments).
+
+Те же версии тегов и время их последнего изменения дают валидаторы
+ETag и Last-Modified (conditional_tagged): на повторный запрос с
+совпавшим If-None-Match отдается 304 без вызова представления.
+"""
+import hashlib
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.cache import cache_page
+
+from . import db_router, metrics
+
+FRAGMENT_RE = re.compile(r'<!--personal:([\w/.-]+)-->')
+
+
+def _version_key(tag):
+    return f'tag_version:{tag}'
+
+
+def _changed_key(tag):
+    return f'tag_changed:{tag}'
+
+
+def _initial_version():
+    # Версия от времени не повторяет старые номера, если ключ вытеснен.
+    return int(time.time() * 1000)
+
+
+def tag_versions(tags) -> str:
+    """Текущие версии тегов одной строкой."""
+    keys = [_version_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump(*tags):
+    """Делает устаревшими все страницы, помеченные тегами."""
+    for tag in tags:
+        key = _version_key(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), None)
+    now = time.time()
+    cache.set_many({_changed_key(tag): now for tag in tags}, None)
+
+
+def tags_changed_at(tags):
+    """Время последнего bump() тегов (timestamp) или None."""
+    changed = cache.get_many([_changed_key(tag) for tag in tags])
+    return max(changed.values(), default=None)
+
+
+def cache_page_tagged(timeout, tags, key_prefix=''):
+    """cache_page, ключ которого зависит от версий тегов."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            rendered = False
+
+            def render(*args, **kwargs):
+                nonlocal rendered
+                rendered = True
+                with db_router.use_primary():
+                    return view_func(*args, **kwargs)
+
+            prefix = f'{key_prefix}:{tag_versions(tags)}'
+            cached_view = cache_page(timeout, key_prefix=prefix)(render)
+            response = cached_view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                metrics.increment(
+                    'yatube_page_cache_requests_total', cache=key_prefix,
+                    result='miss' if rendered else 'hit'
+                )
+            return response
+        return wrapper
+    return decorator
+
+
+def fragment_marker(template_name) -> str:
+    return f'<!--personal:{template_name}-->'
+
+
+def with_personal_fragments(view_func):
+    """Заполняет метки персональных фрагментов для текущего запроса.
+
+    Представление (и кэш под ним) рендерит общую для всех страницу,
+    поэтому декоратор ставится поверх cache_page.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        request.render_shell = True
+        response = view_func(request, *args, **kwargs)
+        request.render_shell = False
+        if response.streaming or 'text/html' not in response.get(
+            'Content-Type', ''
+        ):
+            return response
+        fragments = {}
+
+        def render_fragment(match):
+            name = match.group(1)
+            if name not in fragments:
+                fragments[name] = render_to_string(name, request=request)
+            return fragments[name]
+
+        content = response.content.decode(response.charset)
+        response.content = FRAGMENT_RE.sub(render_fragment, content)
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = len(response.content)
+        # Итоговая страница персональная: общим кэшам ее хранить нельзя.
+        if response.has_header('Expires'):
+            del response['Expires']
+        patch_cache_control(response, private=True, no_cache=True, max_age=0)
+        return response
+    return wrapper
+
+
+def conditional_tagged(tags, latest):
+    """Условный GET: ETag и Last-Modified без рендера страницы.
+
+    tags(request, *args, **kwargs) - теги, от которых зависит страница;
+    latest(request, *args, **kwargs) - дата самой новой записи на ней
+    или None. Дата меняется только вместе с версиями тегов, поэтому она
+    кэшируется под этими версиями. ETag учитывает еще и посетителя
+    (пользователя и CSRF-cookie): в странице есть персональные части.
+    Страница, прочитанная с реплики, отдается без валидаторов.
+    """
+    def decorator(view_func):
+        name = f'{view_func.__module__}.{view_func.__qualname__}'
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            page_tags = tags(request, *args, **kwargs)
+            versions = tag_versions(page_tags)
+            key = 'latest:' + hashlib.md5(
+                f'{name}|{args}|{kwargs}|{page_tags}|{versions}'.encode()
+            ).hexdigest()
+            latest_date = cache.get(key)
+            if latest_date is None:
+                with db_router.use_primary():
+                    latest_date = latest(request, *args, **kwargs) or ''
+                cache.set(key, latest_date)
+            viewer = (
+                request.user.pk,
+                request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+            )
+            etag = quote_etag(hashlib.md5(
+                f'{versions}|{latest_date}|{viewer}'.encode()
+            ).hexdigest())
+            timestamps = [tags_changed_at(page_tags)]
+            if latest_date:
+                timestamps.append(latest_date.timestamp())
+            last_modified = max(filter(None, timestamps), default=None)
+            last_modified = last_modified and int(last_modified)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                with db_router.track_replica_reads() as replica_reads:
+                    response = view_func(request, *args, **kwargs)
+                if replica_reads:
+                    # Валидаторы посчитаны по default, а реплика могла
+                    # отстать: 304 закрепил бы устаревшую страницу.
+                    return response
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if last_modified:
+                    response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,211 @@
+"""Кэш в файле SQLite, общий для всех процессов на сервере.
+
+LocMemCache живет в памяти одного процесса, поэтому сброс версии тега
+или удаление ключа в одном воркере не видно остальным. Этот бэкенд
+хранит записи в одном файле (режим WAL: читатели не ждут писателей),
+вытесняет давно не читанные записи (LRU) и увеличивает счетчики
+атомарно, в транзакции BEGIN IMMEDIATE.
+
+Целые числа хранятся как INTEGER, остальные значения - pickle.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+TOUCH_INTERVAL: float = 1.0  # секунд между обновлениями отметки чтения
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+
+
+def _dumps(value):
+    if type(value) is int:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _loads(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+
+    def _connection(self):
+        # Соединение свое у каждого потока и у каждого процесса после fork.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection, self._local.pid = connection, pid
+        return self._local.connection
+
+    def _write(self, *statements):
+        """Выполняет запросы в одной транзакции записи."""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            cursors = [connection.execute(*query) for query in statements]
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return cursors
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, now = self._key(key, version), time.time()
+        cursor = self._write(
+            ('DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now)),
+            (
+                'INSERT OR IGNORE INTO cache VALUES (?, ?, ?, ?)',
+                (key, _dumps(value), self._expires(timeout), now)
+            ),
+        )[-1]
+        if cursor.rowcount:
+            self._cull()
+        return bool(cursor.rowcount)
+
+    def get(self, key, default=None, version=None):
+        key, now = self._key(key, version), time.time()
+        row = self._connection().execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires, accessed = row
+        if expires is not None and expires <= now:
+            self._write((
+                'DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now)
+            ))
+            return default
+        if now - accessed > TOUCH_INTERVAL:
+            self._write(
+                ('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+            )
+        return _loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._write((
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)',
+            (key, _dumps(value), self._expires(timeout), time.time())
+        ))
+        self._cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires, now = self._expires(timeout), time.time()
+        self._write(*(
+            (
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)',
+                (self._key(key, version), _dumps(value), expires, now)
+            )
+            for key, value in data.items()
+        ))
+        self._cull()
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key, now = self._key(key, version), time.time()
+        cursor = self._write((
+            'UPDATE cache SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), now, key, now)
+        ))[0]
+        return bool(cursor.rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        key, now = self._key(key, version), time.time()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value FROM cache '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, now)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = _loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                (_dumps(value), now, key)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return value
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._write(('DELETE FROM cache WHERE key = ?', (key,)))
+
+    def delete_many(self, keys, version=None):
+        self._write(*(
+            ('DELETE FROM cache WHERE key = ?', (self._key(key, version),))
+            for key in keys
+        ))
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._connection().execute(
+            'SELECT 1 FROM cache '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time())
+        ).fetchone() is not None
+
+    def clear(self):
+        self._write(('DELETE FROM cache',))
+
+    def _cull(self):
+        """Удаляет просроченные записи, а при переполнении - самые старые."""
+        connection = self._connection()
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            self.clear()
+            return
+        self._write(
+            ('DELETE FROM cache WHERE expires <= ?', (time.time(),)),
+            (
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM cache ORDER BY accessed LIMIT ?'
+                ')',
+                (count // self._cull_frequency,)
+            ),
+        )
+
+    def close(self, **kwargs):
+        # Соединение с файлом переиспользуется между запросами.
+        pass
@@ -0,0 +1,99 @@
+"""SQLite с настройками для работы под нагрузкой.
+
+На каждом новом соединении выполняются PRAGMA из PRAGMAS (их можно
+переопределить в OPTIONS['pragmas']):
+
+* journal_mode=WAL - читатели не ждут писателя, писатель не ждет
+  читателей;
+* synchronous=NORMAL - в режиме WAL не теряет целостность, fsync только
+  при checkpoint;
+* mmap_size, cache_size - страницы читаются из отображенного в память
+  файла и кэша соединения, а не системными вызовами;
+* busy_timeout - ожидание блокировки вместо немедленной ошибки
+  "database is locked";
+* temp_store=MEMORY - временные таблицы сортировок в памяти.
+
+PRAGMA выполняются один раз на соединение, поэтому с постоянными
+соединениями (CONN_MAX_AGE) не стоят ничего на запрос. С
+CONN_HEALTH_CHECKS (как в Django 4.1) соединение, оставшееся от
+прошлого запроса, перед первым обращением в новом запросе проверяется
+запросом SELECT 1 и при ошибке открывается заново.
+
+OPTIONS['transaction_mode'] = 'IMMEDIATE' открывает транзакции atomic
+командой BEGIN IMMEDIATE: блокировка записи берется сразу, и транзакция,
+начавшаяся с чтения, не получает "database is locked" при первой записи
+(такую ошибку busy_timeout не лечит). Обслуживание файла - команда
+sqlite_maintenance.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # в КиБ
+    'busy_timeout': 20000,  # мс
+    'temp_store': 'MEMORY',
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+def apply_pragmas(connection, pragmas):
+    """Выполняет PRAGMA на соединении sqlite3."""
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    health_check_done = False
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        self.transaction_mode = params.pop('transaction_mode', None)
+        if self.transaction_mode not in (None, *TRANSACTION_MODES):
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}'
+            )
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        apply_pragmas(connection, self.pragmas)
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        # Вызывается в начале и в конце запроса: соединение, которое
+        # переживет запрос, будет проверено при следующем обращении.
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and not self.health_check_done
+            and not self.in_atomic_block
+            and self.settings_dict.get('CONN_HEALTH_CHECKS')
+        ):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
+
+    def is_usable(self):
+        try:
+            self.connection.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
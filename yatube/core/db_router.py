@@ -0,0 +1,108 @@
+"""Чтение с реплик, запись в основную базу.
+
+ReplicaMiddleware включает чтение с реплики (одной случайной из
+DATABASE_REPLICAS на весь запрос) для GET-запросов к представлениям из
+REPLICA_VIEWS. Остальные запросы, сессии и все записи идут в default.
+
+Реплика отстает от основной базы, поэтому после запроса, который
+что-то записал, браузер получает cookie REPLICA_PIN_COOKIE на
+REPLICA_STICKY_SECONDS секунд, и пока она есть, чтение идет из
+default: автор сразу видит свой пост или комментарий. Интервал
+репликации должен быть меньше этого срока.
+
+Страницы и даты для ETag, которые кладутся в кэш (core.cache), строятся
+по default: кэш живет часами, и значение, собранное с отставшей реплики
+сразу после сброса тегов, так и осталось бы устаревшим. Страница,
+прочитанная с реплики, уходит без ETag и Last-Modified: валидатор по
+default подтвердил бы ее устаревшую копию ответом 304.
+
+Локально реплики - копии файла SQLite, которые обновляет команда
+replicate_sqlite.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Приложения, которые всегда читаются из default: устаревшая сессия
+# на реплике разлогинила бы пользователя, а промах по хранилищу
+# sorl-thumbnail заново создал бы уже готовую миниатюру.
+PRIMARY_APPS = {'sessions', 'thumbnail'}
+
+_state = threading.local()
+
+
+def replicas() -> list:
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def use_replica(alias=None):
+    """Чтение внутри блока идет с реплики alias (по умолчанию случайной)."""
+    previous = getattr(_state, 'replica', None)
+    _state.replica = alias or random.choice(replicas())
+    try:
+        yield _state.replica
+    finally:
+        _state.replica = previous
+
+
+@contextmanager
+def use_primary():
+    """Чтение внутри блока идет из default."""
+    previous = getattr(_state, 'replica', None)
+    _state.replica = None
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+@contextmanager
+def track_writes():
+    """Отмечает, была ли в блоке запись: with track_writes() as writes."""
+    previous = getattr(_state, 'writes', None)
+    writes = _state.writes = []
+    try:
+        yield writes
+    finally:
+        _state.writes = previous
+
+
+@contextmanager
+def track_replica_reads():
+    """Отмечает чтение с реплики в блоке: with ... as reads."""
+    previous = getattr(_state, 'reads', None)
+    reads = _state.reads = []
+    try:
+        yield reads
+    finally:
+        _state.reads = previous
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return None
+        replica = getattr(_state, 'replica', None)
+        reads = getattr(_state, 'reads', None)
+        if replica and reads is not None:
+            reads.append(model._meta.label)
+        return replica
+
+    def db_for_write(self, model, **hints):
+        writes = getattr(_state, 'writes', None)
+        if writes is not None:
+            writes.append(model._meta.label)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии default: объекты из них можно связывать.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема попадает на реплики вместе с данными.
+        if db in replicas():
+            return False
+        return None
@@ -0,0 +1,189 @@
+"""Замеры частей запроса: SQL, шаблоны, кэш и миниатюры.
+
+Пока запрос замеряется (collect), в потоке лежит объект Metrics, и
+точки замера добавляют в него время и счетчики:
+
+* SQL - обертка execute_wrapper на всех соединениях;
+* шаблоны - Template.render (только внешний шаблон, без include);
+* кэш - get и get_many бэкендов из CACHES: попадания и промахи;
+* миниатюры - timer('thumbnail') в posts.thumbnails;
+* соединения с базой - сигнал connection_created (core.signals).
+
+Обертки шаблонов и кэша ставятся один раз (install) и без замера в
+потоке только проверяют threading.local, поэтому почти ничего не стоят.
+Части пересекаются: SQL из шаблона входит и в db, и в template.
+"""
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.base import Template
+
+from . import metrics as collector
+
+_state = threading.local()
+_installed = False
+_install_lock = threading.Lock()
+
+# Части запроса в порядке вывода в Server-Timing.
+PARTS = ('db', 'template', 'cache', 'thumbnail')
+
+
+class Metrics:
+    """Время и число вызовов каждой части одного запроса."""
+
+    def __init__(self):
+        self.durations = dict.fromkeys(PARTS, 0.0)
+        self.counts = dict.fromkeys(PARTS, 0)
+        self.cache_hits = self.cache_misses = 0
+        self.connections = 0
+        self.active = set()
+        self.started = time.perf_counter()
+        self.total = None
+
+    def add(self, part, seconds):
+        self.durations[part] += seconds
+        self.counts[part] += 1
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def as_dict(self) -> dict:
+        data = {'total_ms': round(self.total * 1000, 2)}
+        for part in PARTS:
+            data[f'{part}_ms'] = round(self.durations[part] * 1000, 2)
+            data[f'{part}_count'] = self.counts[part]
+        data.update(
+            cache_hits=self.cache_hits, cache_misses=self.cache_misses,
+            db_connections=self.connections
+        )
+        return data
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing."""
+        entries = [
+            f'{part};dur={self.durations[part] * 1000:.2f};'
+            f'desc="{self.counts[part]}"'
+            for part in PARTS if self.counts[part]
+        ]
+        if self.cache_hits or self.cache_misses:
+            entries.append(
+                f'cache-hit;desc="{self.cache_hits}/'
+                f'{self.cache_hits + self.cache_misses}"'
+            )
+        if self.connections:
+            entries.append(f'db-connect;desc="{self.connections}"')
+        entries.append(f'total;dur={self.total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+def current():
+    """Metrics замеряемого запроса в этом потоке или None."""
+    return getattr(_state, 'metrics', None)
+
+
+@contextmanager
+def timer(part):
+    """Добавляет время блока к части part; вложенные блоки не считаются."""
+    metrics = current()
+    if metrics is None or part in metrics.active:
+        yield
+        return
+    metrics.active.add(part)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.active.discard(part)
+        metrics.add(part, time.perf_counter() - started)
+
+
+def connection_opened(connection):
+    """Считает новое соединение: в запросе и в /metrics по алиасу."""
+    metrics = current()
+    if metrics is not None:
+        metrics.connections += 1
+    collector.increment(
+        'yatube_db_connections_opened_total', alias=connection.alias
+    )
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    with timer('db'):
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def collect():
+    """Замеряет блок (обработку запроса) и отдает его Metrics."""
+    metrics = Metrics()
+    _state.metrics = metrics
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(_execute_wrapper)
+                )
+            yield metrics
+    finally:
+        _state.metrics = None
+        metrics.finish()
+
+
+def _instrument_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        with timer('template'):
+            return render(self, context)
+    return wrapper
+
+
+def _instrument_get(get):
+    missing = object()
+
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        metrics = current()
+        if metrics is None or 'cache' in metrics.active:
+            # Без замера или внутри get_many, который считает сам.
+            return get(self, key, default, version)
+        with timer('cache'):
+            value = get(self, key, missing, version)
+        if value is missing:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+    return wrapper
+
+
+def _instrument_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, version=None):
+        metrics = current()
+        if metrics is None or 'cache' in metrics.active:
+            return get_many(self, keys, version)
+        keys = list(keys)
+        with timer('cache'):
+            values = get_many(self, keys, version)
+        metrics.cache_hits += len(values)
+        metrics.cache_misses += len(keys) - len(values)
+        return values
+    return wrapper
+
+
+def install():
+    """Ставит обертки шаблонов и кэша (один раз на процесс)."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        Template.render = _instrument_render(Template.render)
+        for backend in {type(caches[alias]) for alias in settings.CACHES}:
+            backend.get = _instrument_get(backend.get)
+            backend.get_many = _instrument_get_many(backend.get_many)
+        _installed = True
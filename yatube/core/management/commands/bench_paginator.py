@@ -0,0 +1,38 @@
+from timeit import timeit
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template.loader import get_template
+
+PER_PAGE: int = 10
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время рендера posts/includes/paginator.html '
+        'в зависимости от числа страниц в ленте'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, nargs='+',
+            default=[10, 1000, 100000, 200000],
+            help='Число страниц в ленте'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=200,
+            help='Число рендеров для каждого замера'
+        )
+
+    def handle(self, *args, **options):
+        template = get_template('posts/includes/paginator.html')
+        repeat = options['repeat']
+        for num_pages in options['pages']:
+            paginator = Paginator(range(num_pages * PER_PAGE), PER_PAGE)
+            context = {'page_obj': paginator.page(num_pages // 2 or 1)}
+            elapsed = timeit(lambda: template.render(context), number=repeat)
+            size = len(template.render(context))
+            self.stdout.write(
+                f'{num_pages:>9} страниц: '
+                f'{elapsed / repeat * 1000:.3f} мс, {size} байт'
+            )
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import db_router
+
+
+class Command(BaseCommand):
+    help = (
+        'Заменитель репликации для локальной работы: копирует файл SQLite '
+        'default в файлы реплик DATABASE_REPLICAS через backup API. '
+        'Читатели реплик в режиме WAL не ждут копирования. С --interval '
+        'повторяет копирование, пока команду не остановят'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Повторять каждые N секунд; должно быть меньше '
+                 'REPLICA_STICKY_SECONDS'
+        )
+        parser.add_argument(
+            '--pages', type=int, default=4096,
+            help='Страниц за шаг: между шагами писатели основной базы '
+                 'не ждут копирования'
+        )
+
+    def handle(self, *args, **options):
+        aliases = db_router.replicas()
+        if not aliases:
+            raise CommandError(
+                'Реплик нет: задайте YATUBE_DB_REPLICAS или DATABASE_REPLICAS'
+            )
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Команда только для SQLite')
+        sticky = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+        if options['interval'] and options['interval'] >= sticky:
+            self.stderr.write(
+                f'Интервал не меньше REPLICA_STICKY_SECONDS ({sticky} с): '
+                'автор может не увидеть своих изменений'
+            )
+        while True:
+            for alias in aliases:
+                self.copy(primary, connections[alias], options['pages'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, primary, replica, pages):
+        started = time.perf_counter()
+        source = sqlite3.connect(primary.settings_dict['NAME'])
+        target = sqlite3.connect(replica.settings_dict['NAME'], timeout=20)
+        try:
+            source.backup(target, pages=pages)
+        finally:
+            target.close()
+            source.close()
+        size = os.path.getsize(replica.settings_dict['NAME'])
+        self.stdout.write(
+            f'{replica.alias}: {size // 1024} КиБ за '
+            f'{(time.perf_counter() - started) * 1000:.0f} мс'
+        )
@@ -0,0 +1,54 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Обслуживание файла SQLite: переносит WAL в базу и обрезает его '
+        '(checkpoint), обновляет статистику планировщика (PRAGMA optimize '
+        'или полный ANALYZE). Запускается по расписанию, например cron '
+        'раз в час, или сама с --interval'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Полный ANALYZE вместо PRAGMA optimize'
+        )
+        parser.add_argument(
+            '--interval', type=float,
+            help='Повторять каждые N секунд, пока команду не остановят'
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда только для SQLite')
+        while True:
+            self.maintain(connection, options['analyze'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def maintain(self, connection, analyze):
+        wal = f'{connection.settings_dict["NAME"]}-wal'
+        before = os.path.getsize(wal) if os.path.exists(wal) else 0
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE' if analyze else 'PRAGMA optimize')
+            statistics = time.perf_counter() - started
+            # TRUNCATE ждет читателей (busy_timeout) и обрезает файл WAL.
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            busy, pages, moved = cursor.fetchone()
+        after = os.path.getsize(wal) if os.path.exists(wal) else 0
+        self.stdout.write(
+            f'{"ANALYZE" if analyze else "optimize"}: '
+            f'{statistics * 1000:.0f} мс; checkpoint: '
+            f'{moved}/{pages} страниц'
+            f'{" (занято читателями)" if busy else ""}, '
+            f'WAL {before // 1024} -> {after // 1024} КиБ'
+        )
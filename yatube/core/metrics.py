@@ -0,0 +1,307 @@
+"""Метрики в формате Prometheus, общие для всех процессов WSGI.
+
+Каждый процесс копит счетчики и гистограммы в памяти (под своей
+блокировкой, которую делят только потоки процесса) и не чаще раза в
+FLUSH_INTERVAL секунд записывает снимок в собственный файл METRICS_DIR.
+Запрос к /metrics сначала записывает снимок своего процесса, затем
+читает и складывает файлы всех процессов, поэтому данные других
+процессов отстают не больше чем на FLUSH_INTERVAL. Запись метрик
+обходится без общих блокировок; только чтение /metrics берет файловую
+блокировку каталога.
+
+Счетчики и гистограммы накопительные. Файл завершившегося процесса при
+чтении переносится в общий файл FINISHED_FILE и удаляется, поэтому
+каталог не растет с каждым перезапуском, а суммы не уменьшаются.
+Показатели-gauge (например, очередь миниатюр) берутся только у живых
+процессов.
+"""
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+
+from django.conf import settings
+
+FLUSH_INTERVAL: float = 1.0
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Имя: (тип, описание).
+METRICS = {
+    'yatube_requests_total': (
+        'counter', 'Запросы по представлению, методу и статусу'
+    ),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время обработки запроса'
+    ),
+    'yatube_request_queries': (
+        'histogram', 'SQL-запросов на один запрос'
+    ),
+    'yatube_page_cache_requests_total': (
+        'counter', 'Обращения к кэшу страниц: hit или miss'
+    ),
+    'yatube_page_cache_hit_ratio': (
+        'gauge', 'Доля попаданий в кэш страниц'
+    ),
+    'yatube_db_connections_opened_total': (
+        'counter', 'Открытые соединения с базой'
+    ),
+    'yatube_thumbnail_queue_depth': (
+        'gauge', 'Изображения в очереди на создание вариантов'
+    ),
+}
+FINISHED_FILE = 'finished.json'
+LOCK_FILE = '.lock'
+BUCKETS = {
+    'yatube_request_duration_seconds': LATENCY_BUCKETS,
+    'yatube_request_queries': QUERY_BUCKETS,
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_gauges = {}  # имя: функция без аргументов
+_started = time.time()
+_flushed = 0.0
+
+
+def _directory():
+    return getattr(
+        settings, 'METRICS_DIR', os.path.join(settings.BASE_DIR, 'metrics')
+    )
+
+
+def _key(labels) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def increment(name, value=1, **labels):
+    key = (name, _key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _maybe_flush()
+
+
+def observe(name, value, **labels):
+    """Добавляет значение в гистограмму name."""
+    key = (name, _key(labels))
+    buckets = BUCKETS[name]
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(buckets) + 2)
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[index] += 1
+                break
+        else:
+            histogram[len(buckets)] += 1  # больше последней границы
+        histogram[-1] += value
+    _maybe_flush()
+
+
+def gauge(name, callback):
+    """Регистрирует показатель, значение которого читается при записи."""
+    _gauges[name] = callback
+
+
+def _path():
+    # В имени время старта: новый процесс с тем же pid не затрет файл.
+    return os.path.join(_directory(), f'{os.getpid()}-{_started:.0f}.json')
+
+
+def flush():
+    """Записывает снимок метрик процесса в его файл."""
+    global _flushed
+    with _lock:
+        snapshot = {
+            'pid': os.getpid(),
+            'counters': [
+                [name, labels, value]
+                for (name, labels), value in _counters.items()
+            ],
+            'histograms': [
+                [name, labels, histogram]
+                for (name, labels), histogram in _histograms.items()
+            ],
+        }
+        _flushed = time.monotonic()
+    snapshot['gauges'] = [
+        [name, (), callback()] for name, callback in _gauges.items()
+    ]
+    os.makedirs(_directory(), exist_ok=True)
+    _write(_path(), snapshot)
+
+
+def _maybe_flush():
+    if (
+        time.monotonic() - _flushed >= FLUSH_INTERVAL
+        and getattr(settings, 'METRICS_ENABLED', False)
+    ):
+        flush()
+
+
+def _is_alive(pid) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _add(totals, snapshot):
+    """Прибавляет счетчики и гистограммы снимка к totals."""
+    counters, histograms = totals
+    for metric, labels, value in snapshot['counters']:
+        key = (metric, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for metric, labels, values in snapshot['histograms']:
+        key = (metric, tuple(map(tuple, labels)))
+        total = histograms.setdefault(key, [0] * len(values))
+        for index, value in enumerate(values):
+            total[index] += value
+
+
+def _write(path, snapshot):
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(temporary, path)
+
+
+def _fold(directory, finished, snapshots):
+    """Переносит снимки завершившихся процессов в FINISHED_FILE."""
+    totals = ({}, {})
+    _add(totals, finished)
+    for _, snapshot in snapshots:
+        _add(totals, snapshot)
+    counters, histograms = totals
+    _write(os.path.join(directory, FINISHED_FILE), {
+        'pid': None,
+        'counters': [
+            [name, labels, value] for (name, labels), value in counters.items()
+        ],
+        'histograms': [
+            [name, labels, values]
+            for (name, labels), values in histograms.items()
+        ],
+        'gauges': [],
+    })
+    for name, _ in snapshots:
+        os.remove(os.path.join(directory, name))
+
+
+def _read(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def collect():
+    """Сумма снимков всех процессов: (счетчики, гистограммы, gauge)."""
+    totals, gauges = ({}, {}), {}
+    directory = _directory()
+    if not os.path.isdir(directory):
+        return (*totals, gauges)
+    # Блокировка не дает двум чтениям перенести один файл дважды.
+    with open(os.path.join(directory, LOCK_FILE), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        finished = _read(os.path.join(directory, FINISHED_FILE)) or {
+            'counters': [], 'histograms': []
+        }
+        _add(totals, finished)
+        dead = []
+        for name in os.listdir(directory):
+            if not name.endswith('.json') or name == FINISHED_FILE:
+                continue
+            snapshot = _read(os.path.join(directory, name))
+            if snapshot is None:
+                continue
+            _add(totals, snapshot)
+            if not _is_alive(snapshot['pid']):
+                dead.append((name, snapshot))
+                continue
+            for metric, labels, value in snapshot['gauges']:
+                key = (metric, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+        if dead:
+            _fold(directory, finished, dead)
+    return (*totals, gauges)
+
+
+def _labels(labels, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+        for _, value in pairs
+    )
+    return '{' + ','.join(
+        f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)
+    ) + '}'
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _hit_ratios(counters) -> dict:
+    totals = {}
+    for (metric, labels), value in counters.items():
+        if metric != 'yatube_page_cache_requests_total':
+            continue
+        labels = dict(labels)
+        hits, requests = totals.get(labels['cache'], (0, 0))
+        if labels['result'] == 'hit':
+            hits += value
+        totals[labels['cache']] = (hits, requests + value)
+    return {
+        ('yatube_page_cache_hit_ratio', (('cache', cache),)):
+            hits / requests
+        for cache, (hits, requests) in totals.items() if requests
+    }
+
+
+def render() -> str:
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    flush()
+    counters, histograms, gauges = collect()
+    gauges.update(_hit_ratios(counters))
+    # Строки каждого набора меток идут вместе: бакеты гистограммы
+    # в порядке границ, затем _sum и _count.
+    samples = {name: {} for name in METRICS}
+    for (name, labels), value in {**counters, **gauges}.items():
+        samples.setdefault(name, {})[labels] = [
+            f'{name}{_labels(labels)} {_number(value)}'
+        ]
+    for (name, labels), values in histograms.items():
+        cumulative, group = 0, []
+        bounds = BUCKETS[name] + (math.inf,)
+        for bound, count in zip(bounds, values):
+            cumulative += count
+            group.append(
+                f'{name}_bucket{_labels(labels, le=_number(bound))} '
+                f'{cumulative}'
+            )
+        group.append(f'{name}_sum{_labels(labels)} {values[-1]}')
+        group.append(f'{name}_count{_labels(labels)} {cumulative}')
+        samples[name][labels] = group
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels in sorted(samples[name]):
+            lines.extend(samples[name][labels])
+    return '\n'.join(lines) + '\n'
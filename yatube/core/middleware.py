@@ -0,0 +1,157 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from . import db_router, instrumentation, metrics, queries
+
+logger = logging.getLogger(__name__)
+
+
+class ServerTimingMiddleware:
+    """Замеряет долю запросов PERFORMANCE_SAMPLE_RATE.
+
+    Итог пишется в журнал строкой JSON и, если включен
+    PERFORMANCE_SERVER_TIMING, в заголовок Server-Timing. При доле 0
+    middleware не подключается и ничего не стоит.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, 'PERFORMANCE_SAMPLE_RATE', 0)
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.header = getattr(settings, 'PERFORMANCE_SERVER_TIMING', False)
+        instrumentation.install()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        with instrumentation.collect() as metrics:
+            response = self.get_response(request)
+        if self.header:
+            response['Server-Timing'] = metrics.server_timing()
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            **metrics.as_dict(),
+        }))
+        return response
+
+
+class QueryCounter:
+    """Обертка execute_wrapper, считающая SQL-запросы."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Число запросов, время и SQL-запросы по имени маршрута.
+
+    Значения копятся в core.metrics и выводятся на /metrics. Включается
+    настройкой METRICS_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.increment(
+            'yatube_requests_total',
+            view=view, method=request.method, status=response.status_code
+        )
+        metrics.observe('yatube_request_duration_seconds', elapsed, view=view)
+        metrics.observe('yatube_request_queries', queries.count, view=view)
+        return response
+
+
+class QueryDetectorMiddleware:
+    """Ищет N+1 в каждом запросе (core.queries).
+
+    В режиме 'warn' повторы пишутся в журнал, в 'raise' запрос
+    завершается NPlusOneError, в 'off' middleware не подключается.
+    """
+
+    def __init__(self, get_response):
+        self.mode = getattr(settings, 'QUERY_DETECTOR_MODE', 'off')
+        if self.mode == 'off':
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with queries.Detector() as detector:
+            response = self.get_response(request)
+        if detector.repeats:
+            message = (
+                f'Повторяющиеся запросы в {request.method} {request.path}:\n'
+                f'{detector.report()}'
+            )
+            if self.mode == 'raise':
+                raise queries.NPlusOneError(message)
+            logger.warning(message)
+        return response
+
+
+class ReplicaMiddleware:
+    """Чтение с реплик для REPLICA_VIEWS и закрепление за default.
+
+    После запроса с записью в базу ставит cookie REPLICA_PIN_COOKIE на
+    REPLICA_STICKY_SECONDS секунд; пока она есть, чтение идет из default
+    (core.db_router). Без DATABASE_REPLICAS не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not db_router.replicas():
+            raise MiddlewareNotUsed
+        self.views = set(getattr(settings, 'REPLICA_VIEWS', ()))
+        self.cookie = getattr(settings, 'REPLICA_PIN_COOKIE', 'use_primary')
+        self.sticky = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+        self.get_response = get_response
+
+    def reads_from_replica(self, request) -> bool:
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if self.cookie in request.COOKIES:
+            return False
+        try:
+            return resolve(request.path_info).view_name in self.views
+        except Resolver404:
+            return False
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            if self.reads_from_replica(request):
+                stack.enter_context(db_router.use_replica())
+            writes = stack.enter_context(db_router.track_writes())
+            response = self.get_response(request)
+        if writes:
+            response.set_cookie(
+                self.cookie, '1', max_age=self.sticky, httponly=True,
+                samesite='Lax'
+            )
+        return response
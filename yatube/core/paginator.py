@@ -0,0 +1,121 @@
+from django.core.paginator import Page, Paginator
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_text
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+ELLIPSIS = '…'
+
+
+DEFAULT_KEY = ('pub_date', 'pk')
+
+
+def encode_cursor(obj, key=DEFAULT_KEY) -> str:
+    """Непрозрачный курсор записи по ключу (дата, id)."""
+    date_field, pk_field = key
+    value = f'{getattr(obj, date_field).isoformat()}|{getattr(obj, pk_field)}'
+    return urlsafe_base64_encode(force_bytes(value))
+
+
+def decode_cursor(token):
+    """Ключ (дата, id) из курсора или None, если курсор испорчен."""
+    try:
+        pub_date, pk = force_text(urlsafe_base64_decode(token)).split('|')
+        pub_date, pk = parse_datetime(pub_date), int(pk)
+    except (TypeError, ValueError):
+        return None
+    return (pub_date, pk) if pub_date else None
+
+
+def page_window(page, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей и по краям, пропуски - ELLIPSIS.
+
+    Число элементов не зависит от количества страниц в ленте.
+    """
+    number, num_pages = page.number, page.paginator.num_pages
+    window = range(
+        max(number - on_each_side, 1),
+        min(number + on_each_side, num_pages) + 1
+    )
+    head = range(1, min(on_ends, num_pages) + 1)
+    tail = range(max(num_pages - on_ends + 1, 1), num_pages + 1)
+    previous = 0
+    for i in sorted(set(head) | set(window) | set(tail)):
+        if i - previous > 1:
+            yield ELLIPSIS
+        yield i
+        previous = i
+
+
+class CursorPaginator(Paginator):
+    """Постраничный вывод по ключу (дата, id), по умолчанию (pub_date, id).
+
+    Страница выбирается диапазоном индекса от курсора, без OFFSET и
+    без COUNT(*), поэтому глубокие страницы стоят столько же, сколько
+    первая. Нумерованные страницы (get_page) по-прежнему доступны.
+
+    transform превращает строки страницы в выводимые объекты, например
+    записи ленты в посты.
+    """
+
+    def __init__(self, object_list, per_page, key=DEFAULT_KEY,
+                 transform=None, **kwargs):
+        self.key = key
+        self.transform = transform
+        object_list = object_list.order_by(*(f'-{field}' for field in key))
+        super().__init__(object_list, per_page, **kwargs)
+
+    def _get_page(self, object_list, *args, **kwargs):
+        if self.transform:
+            object_list = self.transform(list(object_list))
+        return super()._get_page(object_list, *args, **kwargs)
+
+    def get_cursor_page(self, after=None, before=None) -> Page:
+        """Страница после курсора after (старее) или перед before (новее)."""
+        date_field, pk_field = self.key
+        queryset = self.object_list
+        after_key = after and decode_cursor(after)
+        before_key = before and decode_cursor(before)
+        if before_key:
+            pub_date, pk = before_key
+            rows = list(
+                queryset.filter(**{f'{date_field}__gte': pub_date})
+                .exclude(**{date_field: pub_date, f'{pk_field}__lte': pk})
+                .order_by(date_field, pk_field)[:self.per_page + 1]
+            )
+            if not rows:
+                return self.get_cursor_page()
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            if after_key:
+                pub_date, pk = after_key
+                queryset = queryset.filter(
+                    **{f'{date_field}__lte': pub_date}
+                ).exclude(**{date_field: pub_date, f'{pk_field}__gte': pk})
+            rows = list(queryset[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = bool(after_key)
+
+        page = self._get_page(rows, 1, self)
+        page.is_cursor = True
+        page.next_cursor = (
+            encode_cursor(rows[-1], self.key) if has_next and rows else None
+        )
+        page.previous_cursor = (
+            encode_cursor(rows[0], self.key)
+            if has_previous and rows else None
+        )
+        return page
+
+
+def get_page(request, object_list, per_page, **kwargs) -> Page:
+    """Страница ленты по курсору (?after=, ?before=) или номеру (?page=)."""
+    paginator = CursorPaginator(object_list, per_page, **kwargs)
+    if 'page' in request.GET:
+        return paginator.get_page(request.GET.get('page'))
+    return paginator.get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
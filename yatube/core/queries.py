@@ -0,0 +1,142 @@
+"""Поиск N+1: одинаковых по форме SQL-запросов, повторенных в блоке.
+
+Форма запроса - SQL без параметров; списки IN (%s, %s, ...) любой длины
+сводятся к одному. Когда форма повторяется QUERY_DETECTOR_THRESHOLD
+раз, запоминаются строка шаблона, из которого выполнен запрос, и стек
+кода проекта - по ним видно, где не хватает select_related. Проверяются
+только SELECT и не к таблицам из QUERY_DETECTOR_IGNORE. Запросы внутри
+unchecked() - фоновая работа, которую без пула потоков приходится
+выполнять в самом запросе, - не проверяются.
+
+QueryDetectorMiddleware проверяет каждый запрос в режиме
+QUERY_DETECTOR_MODE: 'warn' - предупреждение в журнал, 'raise' -
+исключение NPlusOneError (в тестах), 'off' - детектор не подключается.
+query_budget проверяет блок кода в тестах.
+"""
+import re
+import sys
+import threading
+import traceback
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node
+
+THRESHOLD: int = 3
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_RENDER_ANNOTATED = Node.render_annotated.__code__
+_state = threading.local()
+
+
+class NPlusOneError(AssertionError):
+    """Повторяющиеся запросы; AssertionError, чтобы тест именно падал."""
+
+
+@contextmanager
+def unchecked():
+    """Запросы блока не учитываются детектором."""
+    previous = getattr(_state, 'unchecked', False)
+    _state.unchecked = True
+    try:
+        yield
+    finally:
+        _state.unchecked = previous
+
+
+def shape(sql) -> str:
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def _template_line(frame):
+    """Узел шаблона, ближайший к запросу: 'имя:строка содержимое'."""
+    while frame is not None:
+        if frame.f_code is _RENDER_ANNOTATED:
+            node = frame.f_locals['self']
+            if node.token is not None:
+                origin = node.origin
+                name = origin.template_name or origin.name if origin else '?'
+                return f'{name}:{node.token.lineno} {node.token.contents}'
+        frame = frame.f_back
+    return None
+
+
+def _stack(frame) -> str:
+    """Стек вызова без библиотек: только файлы проекта."""
+    root = str(settings.BASE_DIR)
+    return ''.join(traceback.format_list([
+        entry for entry in traceback.extract_stack(frame)
+        if entry.filename.startswith(root) and entry.filename != __file__
+    ]))
+
+
+class Detector:
+    """Считает запросы блока по формам: with Detector() as detector."""
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or getattr(
+            settings, 'QUERY_DETECTOR_THRESHOLD', THRESHOLD
+        )
+        self.ignore = tuple(
+            f'"{table}"'
+            for table in getattr(settings, 'QUERY_DETECTOR_IGNORE', ())
+        )
+        self.counts = {}
+        self.origins = {}  # форма: (строка шаблона, стек)
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_state, 'unchecked', False):
+            return execute(sql, params, many, context)
+        key = shape(sql)
+        count = self.counts[key] = self.counts.get(key, 0) + 1
+        self.total += 1
+        if (
+            count == self.threshold and key.startswith('SELECT')
+            and not any(table in key for table in self.ignore)
+        ):
+            frame = sys._getframe(1)
+            self.origins[key] = (_template_line(frame), _stack(frame))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrappers = ExitStack()
+        for connection in connections.all():
+            self._wrappers.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrappers.close()
+
+    @property
+    def repeats(self) -> list:
+        """[(форма, повторов, строка шаблона, стек)] сверх порога."""
+        return [
+            (key, self.counts[key], *origin)
+            for key, origin in self.origins.items()
+        ]
+
+    def report(self) -> str:
+        parts = []
+        for key, count, template, stack in self.repeats:
+            parts.append(f'{count} x {key}')
+            if template:
+                parts.append(f'  шаблон: {template}')
+            parts.append(stack.rstrip())
+        return '\n'.join(parts)
+
+
+@contextmanager
+def query_budget(max_queries=None, threshold=None):
+    """Проверяет блок: без N+1 и не больше max_queries запросов."""
+    with Detector(threshold) as detector:
+        yield detector
+    if detector.repeats:
+        raise NPlusOneError(f'Повторяющиеся запросы:\n{detector.report()}')
+    if max_queries is not None and detector.total > max_queries:
+        raise AssertionError(
+            f'{detector.total} запросов при бюджете {max_queries}:\n'
+            + '\n'.join(
+                f'{count} x {key}' for key, count in detector.counts.items()
+            )
+        )
@@ -0,0 +1,10 @@
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import instrumentation
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    """Учитывает новое соединение с базой в замерах и /metrics."""
+    instrumentation.connection_opened(connection)
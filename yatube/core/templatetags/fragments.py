@@ -0,0 +1,21 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.cache import fragment_marker
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, template_name):
+    """Персональный фрагмент страницы.
+
+    В общем кэшируемом шаблоне страницы на его месте остается метка,
+    которая заполняется для каждого запроса отдельно.
+    """
+    request = context.get('request')
+    if getattr(request, 'render_shell', False):
+        return mark_safe(fragment_marker(template_name))
+    return context.template.engine.get_template(template_name).render(
+        context
+    )
@@ -0,0 +1,10 @@
+from django import template
+
+from core import paginator
+
+register = template.Library()
+
+
+@register.filter
+def page_window(page, on_each_side=2):
+    return paginator.page_window(page, on_each_side)
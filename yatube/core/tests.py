@@ -0,0 +1,490 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from multiprocessing import get_context
+
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.template import engines
+from django.test import (
+    Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import queries
+from core.cache_backends import SQLiteCache
+
+
+def increment(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {'OPTIONS': {'MAX_ENTRIES': 10}})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_values_are_shared_between_instances(self):
+        """Запись видна другому экземпляру кэша с тем же файлом"""
+        other = SQLiteCache(self.path, {})
+        values = {'text': 'Тест', 'number': 5, 'data': {'list': [1, 2]}}
+        for key, value in values.items():
+            with self.subTest(key=key):
+                self.cache.set(key, value)
+                self.assertEqual(other.get(key), value)
+        other.delete('text')
+        self.assertIsNone(self.cache.get('text'))
+
+    def test_expired_values_are_missing(self):
+        self.cache.set('key', 'value', timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new value'))
+        self.assertFalse(self.cache.add('key', 'other value'))
+        self.assertEqual(self.cache.get('key'), 'new value')
+
+    def test_incr(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_incr_is_atomic_across_processes(self):
+        """Счетчик не теряет увеличения из разных процессов"""
+        self.cache.set('counter', 0)
+        context = get_context('spawn')
+        processes = [
+            context.Process(target=increment, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_least_recently_used_are_culled(self):
+        """При переполнении вытесняются давно не читанные записи"""
+        self.cache.set('hot', 'value')
+        for number in range(15):
+            self.cache._connection().execute(
+                "UPDATE cache SET accessed = ? WHERE key LIKE '%hot'",
+                (time.time() + 60,)
+            )
+            self.cache.set(f'cold_{number}', number)
+        self.assertEqual(self.cache.get('hot'), 'value')
+        self.assertIsNone(self.cache.get('cold_0'))
+
+
+@override_settings(PERFORMANCE_SAMPLE_RATE=1, PERFORMANCE_SERVER_TIMING=True)
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Модели импортируются здесь: модуль загружают и дочерние
+        # процессы test_incr_is_atomic_across_processes, без django.setup.
+        from django.contrib.auth import get_user_model
+
+        from posts.models import Post
+
+        author = get_user_model().objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_header_and_log_line(self):
+        """Время SQL, шаблонов и кэша - в Server-Timing и в журнале"""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            response = Client().get(url)
+        timing = response['Server-Timing']
+        for part in ('db;dur=', 'template;dur=', 'cache-hit;', 'total;dur='):
+            with self.subTest(part=part):
+                self.assertIn(part, timing)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:post_detail')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db_count'], 0)
+        self.assertEqual(record['template_count'], 1)
+        self.assertGreater(record['cache_misses'], 0)
+        # Соединение открыто до запроса и переиспользуется.
+        self.assertEqual(record['db_connections'], 0)
+
+    def test_cached_page_counts_cache_hits(self):
+        client = Client()
+        # Оба запроса внутри assertLogs: иначе строка журнала первого
+        # попадает в вывод тестов.
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            client.get(reverse('posts:index'))
+            client.get(reverse('posts:index'))
+        record = json.loads(logs.records[1].getMessage())
+        self.assertEqual(record['db_count'], 0)
+        self.assertGreater(record['cache_hits'], 0)
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0)
+    def test_disabled_without_sampling(self):
+        response = Client().get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
+
+
+def sample(text, line):
+    """Значение строки line из вывода /metrics или 0."""
+    for current in text.splitlines():
+        if current.startswith(line + ' '):
+            return float(current.rsplit(' ', 1)[1])
+    return 0
+
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.directory_settings = override_settings(METRICS_DIR=cls.directory)
+        cls.directory_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory_settings.disable()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def metrics(self):
+        response = Client().get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('version=0.0.4', response['Content-Type'])
+        return response.content.decode()
+
+    def test_requests_and_page_cache(self):
+        """Запросы считаются по маршруту, кэш страниц - по попаданиям"""
+        requests = (
+            'yatube_requests_total'
+            '{method="GET",status="200",view="posts:index"}'
+        )
+        count = 'yatube_request_queries_count{view="posts:index"}'
+        hits = (
+            'yatube_page_cache_requests_total'
+            '{cache="index_posts",result="hit"}'
+        )
+        before = self.metrics()
+        client = Client()
+        for _ in range(3):
+            client.get(reverse('posts:index'))
+        after = self.metrics()
+        self.assertEqual(sample(after, requests) - sample(before, requests), 3)
+        self.assertEqual(sample(after, count) - sample(before, count), 3)
+        self.assertEqual(sample(after, hits) - sample(before, hits), 2)
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"}', after
+        )
+        self.assertIn(
+            'yatube_page_cache_hit_ratio{cache="index_posts"}', after
+        )
+        self.assertIn('# TYPE yatube_thumbnail_queue_depth gauge', after)
+
+    def test_histogram_buckets_follow_bounds(self):
+        """Бакеты гистограммы идут по возрастанию границ, затем sum и count"""
+        Client().get(reverse('posts:index'))
+        prefix = 'yatube_request_duration_seconds'
+        lines = [
+            line for line in self.metrics().splitlines()
+            if line.startswith(prefix) and 'view="posts:index"' in line
+        ]
+        bounds = [
+            float(line.split('le="')[1].split('"')[0])
+            for line in lines[:-2]
+        ]
+        self.assertEqual(bounds, sorted(bounds))
+        self.assertEqual(bounds[-1], float('inf'))
+        counts = [float(line.split()[-1]) for line in lines[:-2]]
+        self.assertEqual(counts, sorted(counts))
+        self.assertTrue(lines[-2].startswith(f'{prefix}_sum{{'))
+        self.assertTrue(lines[-1].startswith(f'{prefix}_count{{'))
+
+    def test_other_processes_are_summed(self):
+        """Файлы других процессов складываются, gauge - только у живых"""
+        requests = (
+            'yatube_requests_total'
+            '{method="GET",status="200",view="posts:index"}'
+        )
+        before = sample(self.metrics(), requests)
+        with open(os.path.join(self.directory, '1-0.json'), 'w') as file:
+            json.dump({
+                'pid': 2 ** 22 + 1,  # такого процесса нет
+                'counters': [[
+                    'yatube_requests_total',
+                    [['method', 'GET'], ['status', 200],
+                     ['view', 'posts:index']],
+                    5
+                ]],
+                'histograms': [],
+                'gauges': [['yatube_thumbnail_queue_depth', [], 100]],
+            }, file)
+        text = self.metrics()
+        self.assertEqual(sample(text, requests), before + 5)
+        self.assertLess(sample(text, 'yatube_thumbnail_queue_depth'), 100)
+
+    def test_finished_processes_are_folded(self):
+        """Файл завершившегося процесса удаляется, его счетчики остаются"""
+        requests = 'yatube_requests_total{view="posts:index"}'
+        before = sample(self.metrics(), requests)
+        path = os.path.join(self.directory, '2-0.json')
+        with open(path, 'w') as file:
+            json.dump({
+                'pid': 2 ** 22 + 2,  # такого процесса нет
+                'counters': [
+                    ['yatube_requests_total', [['view', 'posts:index']], 7]
+                ],
+                'histograms': [],
+                'gauges': [],
+            }, file)
+        self.assertEqual(sample(self.metrics(), requests), before + 7)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(sample(self.metrics(), requests), before + 7)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_hidden_from_other_addresses(self):
+        response = Client().get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_hidden_when_disabled(self):
+        response = Client().get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryDetectorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from django.contrib.auth import get_user_model
+
+        from posts.models import Post
+
+        cls.Post = Post
+        for number in range(3):
+            author = get_user_model().objects.create_user(
+                username=f'author_{number}'
+            )
+            Post.objects.create(text='Пост', author=author)
+
+    def render(self, posts):
+        template = engines['django'].from_string(
+            '{% for post in posts %}\n{{ post.author.username }}\n'
+            '{% endfor %}'
+        )
+        return template.render({'posts': posts})
+
+    def test_lazy_foreign_key_is_reported(self):
+        """N+1 в шаблоне: ошибка со строкой шаблона и стеком"""
+        with self.assertRaises(queries.NPlusOneError) as error:
+            with queries.query_budget():
+                self.render(self.Post.objects.all())
+        message = str(error.exception)
+        self.assertIn('3 x SELECT', message)
+        self.assertIn(':2 post.author.username', message)
+        self.assertIn('core/tests.py', message)
+
+    def test_select_related_passes_budget(self):
+        with queries.query_budget(1) as detector:
+            self.render(self.Post.objects.select_related('author'))
+        self.assertEqual(detector.total, 1)
+
+    def test_budget_is_enforced(self):
+        with self.assertRaisesMessage(AssertionError, 'при бюджете 1'):
+            with queries.query_budget(1):
+                list(self.Post.objects.all())
+                list(self.Post.objects.filter(pk=1))
+
+    def test_unchecked_block_is_skipped(self):
+        with queries.query_budget(0):
+            with queries.unchecked():
+                self.render(self.Post.objects.all())
+
+    def test_in_lists_have_one_shape(self):
+        self.assertEqual(
+            queries.shape('WHERE "id" IN (%s, %s, %s)'),
+            queries.shape('WHERE "id" IN (%s)')
+        )
+
+    @override_settings(QUERY_DETECTOR_MODE='warn')
+    def test_middleware_warns(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+
+        from core.middleware import QueryDetectorMiddleware
+
+        middleware = QueryDetectorMiddleware(
+            lambda request: HttpResponse(self.render(self.Post.objects.all()))
+        )
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/feed/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('GET /feed/', logs.output[0])
+
+
+class SQLiteBackendTests(TransactionTestCase):
+    def test_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            for pragma, value in (
+                ('synchronous', 1), ('busy_timeout', 20000),
+                ('temp_store', 2), ('cache_size', -65536),
+            ):
+                with self.subTest(pragma=pragma):
+                    cursor.execute(f'PRAGMA {pragma}')
+                    self.assertEqual(cursor.fetchone()[0], value)
+
+    def test_atomic_takes_write_lock_at_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                connection.cursor().execute('SELECT 1')
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # В тестах replica1 - второе соединение с той же базой в памяти; оно
+    # не видит данных, пока они в незавершенной транзакции TestCase.
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+
+        from posts.models import Post
+
+        self.author = get_user_model().objects.create_user(username='author')
+        self.post = Post.objects.create(text='Пост', author=self.author)
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def replica_queries(self, method, url, **data):
+        with CaptureQueriesContext(connections['replica1']) as queries:
+            response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 400)
+        return len(queries)
+
+    def test_read_only_views_use_replica(self):
+        detail = reverse('posts:post_detail', args=(self.post.pk,))
+        self.assertGreater(self.replica_queries('get', detail), 0)
+        self.assertEqual(
+            self.replica_queries('get', reverse('posts:follow_index')), 0
+        )
+
+    def test_cached_page_is_built_from_primary(self):
+        with CaptureQueriesContext(connections['replica1']) as queries:
+            response = self.client.get(reverse('posts:index'))
+        # Страница из default, поэтому валидаторы ей можно отдавать.
+        self.assertIn('ETag', response)
+        # С реплики читается только пользователь, лента - из default.
+        self.assertEqual(
+            [query['sql'] for query in queries if 'posts_' in query['sql']],
+            []
+        )
+
+    def test_writer_is_pinned_to_primary(self):
+        """После записи автор читает из default, пока жива cookie"""
+        self.replica_queries(
+            'post', reverse('posts:add_comment', args=(self.post.pk,)),
+            text='Комментарий'
+        )
+        cookie = self.client.cookies['use_primary']
+        self.assertEqual(cookie['max-age'], 10)
+        detail = reverse('posts:post_detail', args=(self.post.pk,))
+        self.assertEqual(self.replica_queries('get', detail), 0)
+        del self.client.cookies['use_primary']
+        self.assertGreater(self.replica_queries('get', detail), 0)
+
+    def test_stale_replica_page_is_not_validated(self):
+        """Страница с отставшей реплики не получает ETag и 304"""
+        from core.db_backends.sqlite3.base import DatabaseWrapper
+        from posts.models import Post
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        replica = DatabaseWrapper({
+            **connections['replica1'].settings_dict,
+            'NAME': os.path.join(directory, 'replica.sqlite3'),
+        }, alias='replica1')
+        self.addCleanup(replica.close)
+
+        def replicate():
+            connection.ensure_connection()
+            replica.ensure_connection()
+            connection.connection.backup(replica.connection)
+
+        mirror = connections['replica1']
+        connections['replica1'] = replica
+        self.addCleanup(connections.__setitem__, 'replica1', mirror)
+        replicate()
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        url = reverse('posts:profile', args=(self.author.username,))
+        guest = Client()
+        stale = guest.get(url)
+        self.assertNotIn(new_post.text, stale.content.decode())
+        self.assertNotIn('ETag', stale)
+        self.assertNotIn('Last-Modified', stale)
+        replicate()
+        fresh = guest.get(
+            url, HTTP_IF_NONE_MATCH=stale.get('ETag', '"stale"')
+        )
+        self.assertEqual(fresh.status_code, 200)
+        self.assertIn(new_post.text, fresh.content.decode())
+
+
+class ConnectionHealthTests(SimpleTestCase):
+    def setUp(self):
+        from core.db_backends.sqlite3.base import DatabaseWrapper
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.database = DatabaseWrapper({
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(directory, 'health.sqlite3'),
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+        }, alias='health')
+        self.addCleanup(self.database.close)
+
+    def query(self):
+        with self.database.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+    def opened(self, requests):
+        """Число новых соединений за requests запросов."""
+        from core import instrumentation
+
+        with instrumentation.collect() as metrics:
+            for request in requests:
+                self.database.close_if_unusable_or_obsolete()
+                request()
+        return metrics.connections
+
+    def test_connection_is_reused_between_requests(self):
+        self.assertEqual(self.opened([self.query] * 5), 1)
+
+    def test_broken_connection_is_replaced(self):
+        """Соединение, сломанное между запросами, открывается заново"""
+        self.query()
+
+        def break_and_query():
+            self.database.connection.close()
+            self.database.close_if_unusable_or_obsolete()
+            self.query()
+
+        self.assertEqual(self.opened([break_and_query]), 1)
@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from . import metrics as collector
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -11,3 +15,17 @@ def csrf_failure(request, reason=''):
 
 def internal_server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def metrics(request):
+    """Метрики Prometheus, если включены; доступны с METRICS_ALLOWED_IPS."""
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if (
+        not getattr(settings, 'METRICS_ENABLED', False)
+        or request.META.get('REMOTE_ADDR') not in allowed
+    ):
+        raise Http404
+    return HttpResponse(
+        collector.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
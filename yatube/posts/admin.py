@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.db import connection
 from .models import Post, Group, Comment, Follow
+from .search import match_expression, matching_ids
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -9,6 +11,14 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по индексу FTS5 вместо LIKE '%...%' по всей таблице.
+        if connection.vendor != 'sqlite' or not match_expression(search_term):
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return queryset.filter(pk__in=matching_ids(search_term)), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('pk', 'title', 'description', )
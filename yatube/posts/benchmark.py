@@ -0,0 +1,346 @@
+"""Замер задержки представлений на заполненной базе.
+
+Каждый сценарий (SCENARIOS) выбирает случайный объект (группу, автора,
+пост, подписчика) и страницу ленты по курсору (?after=), как ее
+открывают ссылки «дальше», и выполняет запрос через тестовый клиент Django -
+полный путь через middleware, URLconf, представление и шаблоны - или
+по HTTP к запущенному серверу (base_url). Результат по сценарию:
+перцентили задержки, среднее число SQL-запросов (только для тестового
+клиента) и пропускная способность. Нумерованные страницы (?page=, COUNT
+и OFFSET) замеряются отдельным сценарием index_numbered.
+
+Результаты сохраняются в JSON и сравниваются с сохраненной базовой
+линией: рост p95 больше допуска или рост числа запросов - регрессия.
+"""
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+import requests as http
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import db_router
+from core.paginator import DEFAULT_KEY, encode_cursor
+from .models import Follow, Group, Post
+from .views import POSTS_COUNT
+
+User = get_user_model()
+
+SAMPLE_SIZE: int = 200  # объектов каждого вида, из которых выбираются цели
+LOGGED_IN: int = 20  # пользователей с открытой сессией
+PAGES: int = 5  # страниц ленты, среди которых выбирается открываемая
+TOLERANCE: float = 0.2  # допустимый рост p95 относительно базовой линии
+# Допустимый рост среднего числа запросов: случайные цели дают разброс.
+QUERIES_TOLERANCE: float = 0.5
+
+
+def _sample(queryset, rng, size=SAMPLE_SIZE):
+    """Случайные значения из queryset без ORDER BY RANDOM()."""
+    values = list(queryset)
+    return rng.sample(values, min(size, len(values)))
+
+
+class Targets:
+    """Объекты, к которым обращаются сценарии."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.slugs = _sample(Group.objects.values_list('slug', flat=True), rng)
+        self.usernames = _sample(
+            User.objects.filter(posts__isnull=False).distinct()
+            .values_list('username', flat=True),
+            rng
+        )
+        last = Post.objects.order_by('-pk').values_list('pk', flat=True)
+        last = last.first() or 0
+        self.post_ids = list(
+            Post.objects.filter(
+                pk__in=rng.sample(range(1, last + 1), min(SAMPLE_SIZE, last))
+            ).values_list('pk', flat=True)
+        )
+        self.readers = _sample(
+            User.objects.filter(
+                pk__in=Follow.objects.values('user')
+            ).values_list('pk', flat=True),
+            rng, LOGGED_IN
+        )
+
+    def page(self):
+        return {'page': self.rng.randint(1, PAGES)}
+
+    def cursor(self, posts):
+        """?after= случайной из первых PAGES страниц ленты posts."""
+        skipped = self.rng.randrange(PAGES) * POSTS_COUNT
+        if not skipped:
+            return {}
+        last = posts.order_by(
+            *(f'-{field}' for field in DEFAULT_KEY)
+        )[skipped - 1:skipped].first()
+        return {'after': encode_cursor(last)} if last else {}
+
+    def choice(self, values, scenario):
+        if not values:
+            raise ValueError(f'Нет данных для сценария {scenario}')
+        return self.rng.choice(values)
+
+
+def _index(targets):
+    return (
+        'get', reverse('posts:index'), targets.cursor(Post.objects.all()),
+        None
+    )
+
+
+def _group_posts(targets):
+    slug = targets.choice(targets.slugs, 'group_posts')
+    return (
+        'get', reverse('posts:group_list', args=(slug,)),
+        targets.cursor(Post.objects.filter(group__slug=slug)), None
+    )
+
+
+def _profile(targets):
+    username = targets.choice(targets.usernames, 'profile')
+    return (
+        'get', reverse('posts:profile', args=(username,)),
+        targets.cursor(Post.objects.filter(author__username=username)),
+        None
+    )
+
+
+def _follow_index(targets):
+    reader = targets.choice(targets.readers, 'follow_index')
+    return (
+        'get', reverse('posts:follow_index'),
+        targets.cursor(Post.objects.filter(author__following__user=reader)),
+        reader
+    )
+
+
+# Сценарий: (targets) -> (метод, адрес, данные, id пользователя или None).
+SCENARIOS = {
+    'index': _index,
+    'index_numbered': lambda targets: (
+        'get', reverse('posts:index'), targets.page(), None
+    ),
+    'group_posts': _group_posts,
+    'profile': _profile,
+    'post_detail': lambda targets: (
+        'get',
+        reverse('posts:post_detail', args=(
+            targets.choice(targets.post_ids, 'post_detail'),
+        )),
+        {}, None
+    ),
+    'follow_index': _follow_index,
+    'add_comment': lambda targets: (
+        'post',
+        reverse('posts:add_comment', args=(
+            targets.choice(targets.post_ids, 'add_comment'),
+        )),
+        {'text': 'Комментарий из замера'},
+        targets.choice(targets.readers, 'add_comment')
+    ),
+}
+
+
+class ClientTransport:
+    """Запросы через тестовый клиент в том же процессе."""
+
+    def __init__(self):
+        self.clients = {None: Client()}
+
+    def client(self, user_id):
+        if user_id not in self.clients:
+            client = Client()
+            client.force_login(User.objects.get(pk=user_id))
+            self.clients[user_id] = client
+        return self.clients[user_id]
+
+    def request(self, method, url, data, user_id):
+        client = self.client(user_id)
+        with ExitStack() as stack:
+            # С репликами (core.db_router) запросы идут в разные базы.
+            captured = [
+                stack.enter_context(
+                    CaptureQueriesContext(connections[alias])
+                )
+                for alias in (DEFAULT_DB_ALIAS, *db_router.replicas())
+            ]
+            response = getattr(client, method)(url, data)
+        return response.status_code, sum(map(len, captured))
+
+
+class HttpTransport:
+    """Запросы по HTTP к запущенному серверу с той же базой."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.sessions = {}
+
+    def session(self, user_id):
+        if user_id not in self.sessions:
+            session = http.Session()
+            if user_id is not None:
+                # Сессия создается в общей базе, cookie переносится.
+                client = Client()
+                client.force_login(User.objects.get(pk=user_id))
+                session.cookies.update({
+                    name: morsel.value
+                    for name, morsel in client.cookies.items()
+                })
+            session.get(f'{self.base_url}{reverse("posts:index")}')
+            self.sessions[user_id] = session
+        return self.sessions[user_id]
+
+    def request(self, method, url, data, user_id):
+        session = self.session(user_id)
+        if method == 'get':
+            response = session.get(
+                f'{self.base_url}{url}', params=data, allow_redirects=False
+            )
+        else:
+            response = session.post(
+                f'{self.base_url}{url}', data=data, allow_redirects=False,
+                headers={'X-CSRFToken': session.cookies.get('csrftoken', '')}
+            )
+        return response.status_code, None
+
+
+def percentile(values, percent) -> float:
+    """Перцентиль с линейной интерполяцией между соседними значениями.
+
+    То же, что statistics.quantiles(method='inclusive'), которого нет в
+    Python 3.7.
+    """
+    values = sorted(values)
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower
+    )
+
+
+def summarize(latencies, queries, elapsed) -> dict:
+    """Перцентили задержки в мс, среднее число запросов, запросов/с."""
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+        'queries': (
+            round(statistics.mean(queries), 2) if queries else None
+        ),
+        'rps': round(len(latencies) / elapsed, 1),
+    }
+
+
+def run_scenario(name, transport, targets, requests, warmup=10,
+                 concurrency=1, cold=False):
+    """Выполняет сценарий requests раз и возвращает сводку."""
+    make_request = SCENARIOS[name]
+    calls = [make_request(targets) for _ in range(warmup + requests)]
+    errors = []
+
+    def timed(call):
+        if cold:
+            cache.clear()
+        started = time.perf_counter()
+        status, count = transport.request(*call)
+        if status >= 400:
+            errors.append(status)
+        return time.perf_counter() - started, count
+
+    for call in calls[:warmup]:
+        timed(call)
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(timed, calls[warmup:]))
+    else:
+        results = [timed(call) for call in calls[warmup:]]
+    elapsed = time.perf_counter() - started
+    summary = summarize(
+        [latency for latency, _ in results],
+        [count for _, count in results if count is not None],
+        elapsed
+    )
+    summary['errors'] = len(errors)
+    return summary
+
+
+def run(scenarios=None, requests=100, warmup=10, seed=0, base_url=None,
+        concurrency=1, cold=False) -> dict:
+    """Сводки всех сценариев: {имя сценария: сводка}.
+
+    Параллельные запросы (concurrency) - только по HTTP: тестовый клиент
+    считает запросы к базе одного потока.
+    """
+    rng = random.Random(seed)
+    targets = Targets(rng)
+    if base_url:
+        transport = HttpTransport(base_url)
+    else:
+        transport, concurrency = ClientTransport(), 1
+    return {
+        name: run_scenario(
+            name, transport, targets, requests, warmup, concurrency, cold
+        )
+        for name in scenarios or SCENARIOS
+    }
+
+
+def dataset() -> dict:
+    """Размер данных, на которых выполнен замер."""
+    return {
+        'users': User.objects.count(),
+        'groups': Group.objects.count(),
+        'posts': Post.objects.count(),
+        'follows': Follow.objects.count(),
+    }
+
+
+def save(path, results, **meta):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(
+            {'meta': meta, 'results': results}, file,
+            ensure_ascii=False, indent=2, sort_keys=True
+        )
+
+
+def load(path) -> dict:
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def compare(results, baseline, tolerance=TOLERANCE) -> list:
+    """Регрессии относительно базовой линии: список строк-описаний."""
+    regressions = []
+    for name, summary in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if summary['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(
+                f'{name}: p95 {before["p95_ms"]} -> {summary["p95_ms"]} мс'
+            )
+        if (
+            summary['queries'] is not None
+            and before.get('queries') is not None
+            and summary['queries'] > before['queries'] + QUERIES_TOLERANCE
+        ):
+            regressions.append(
+                f'{name}: запросов {before["queries"]} -> '
+                f'{summary["queries"]}'
+            )
+    return regressions
@@ -0,0 +1,112 @@
+"""Денормализованные счетчики постов, подписчиков и комментариев.
+
+Счетчик - число строк модели, ссылающихся на объект через поле
+(COUNTERS). Сигналы меняют его выражением F() при создании и удалении
+строк, поэтому страницы читают готовые числа без COUNT(*). Если значения
+разошлись с данными, их пересчитывает команда rebuild_counters.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Comment, Counter, Follow, Post
+
+# Имя счетчика: (модель, поле, ссылающееся на объект).
+COUNTERS = {
+    'user.posts': (Post, 'author'),
+    'user.followers': (Follow, 'author'),
+    'user.following': (Follow, 'user'),
+    'group.posts': (Post, 'group'),
+    'post.comments': (Comment, 'post'),
+}
+BATCH_SIZE: int = 500
+
+
+def _count(name, object_id) -> int:
+    model, field = COUNTERS[name]
+    return model.objects.filter(**{field: object_id}).count()
+
+
+def change(name, object_id, delta):
+    """Прибавляет delta к счетчику. Если строки нет, считает заново."""
+    if object_id is None:
+        return
+    counter = Counter.objects.filter(name=name, object_id=object_id)
+    if counter.update(value=F('value') + delta):
+        return
+    try:
+        with transaction.atomic():
+            Counter.objects.create(
+                name=name, object_id=object_id,
+                value=_count(name, object_id)
+            )
+    except IntegrityError:
+        # Строку одновременно создал другой запрос.
+        counter.update(value=F('value') + delta)
+
+
+def track(instance, delta):
+    """Меняет все счетчики, которые учитывают строку instance."""
+    for name, (model, field) in COUNTERS.items():
+        if isinstance(instance, model):
+            change(name, getattr(instance, f'{field}_id'), delta)
+
+
+def get(name, object_ids) -> dict:
+    """Значения счетчика для нескольких объектов одним запросом."""
+    values = dict(
+        Counter.objects.filter(name=name, object_id__in=object_ids)
+        .values_list('object_id', 'value')
+    )
+    return {object_id: values.get(object_id, 0) for object_id in object_ids}
+
+
+def of(kind, object_id) -> dict:
+    """Все счетчики объекта одним запросом: {'posts': 3, ...}."""
+    names = [name for name in COUNTERS if name.startswith(f'{kind}.')]
+    values = dict(
+        Counter.objects.filter(name__in=names, object_id=object_id)
+        .values_list('name', 'value')
+    )
+    return {
+        name.split('.', 1)[1]: values.get(name, 0) for name in names
+    }
+
+
+def rebuild(names=None) -> dict:
+    """Пересчитывает счетчики по данным.
+
+    Возвращает число исправленных значений для каждого счетчика.
+    """
+    fixed = {}
+    for name in names or COUNTERS:
+        model, field = COUNTERS[name]
+        actual = dict(
+            model.objects.filter(**{f'{field}__isnull': False})
+            .values_list(field).annotate(Count('pk')).order_by()
+        )
+        stored = dict(
+            Counter.objects.filter(name=name).values_list('object_id', 'value')
+        )
+        changed = {
+            object_id: value for object_id, value in actual.items()
+            if stored.get(object_id) != value
+        }
+        stale = [object_id for object_id in stored if object_id not in actual]
+        outdated = list(changed) + stale
+        with transaction.atomic():
+            for start in range(0, len(outdated), BATCH_SIZE):
+                Counter.objects.filter(
+                    name=name,
+                    object_id__in=outdated[start:start + BATCH_SIZE]
+                ).delete()
+            Counter.objects.bulk_create(
+                (
+                    Counter(name=name, object_id=object_id, value=value)
+                    for object_id, value in changed.items()
+                ),
+                batch_size=BATCH_SIZE
+            )
+        fixed[name] = len(changed) + sum(
+            1 for object_id in stale if stored[object_id]
+        )
+    return fixed
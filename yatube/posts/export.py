@@ -0,0 +1,112 @@
+"""Потоковая выгрузка постов и комментариев в NDJSON и CSV.
+
+Строки читаются по первичному ключу кусками (iterator(chunk_size=...)),
+и сериализуется сразу весь кусок, поэтому память не растет с размером
+таблицы. since=<id> выгружает только строки, добавленные после
+предыдущей выгрузки: id последней строки и есть следующий since.
+"""
+import csv
+import io
+from json.encoder import encode_basestring
+from itertools import islice
+
+from django.db import connection
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+from .models import Comment, Post
+
+# Что выгружается: модель и поля в порядке колонок.
+EXPORTS = {
+    'posts': (
+        Post, ('id', 'pub_date', 'author_id', 'group_id', 'text', 'image')
+    ),
+    'comments': (
+        Comment, ('id', 'pub_date', 'post_id', 'author_id', 'text')
+    ),
+}
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+CHUNK_SIZE: int = 5000
+
+
+def _rows(kind, since):
+    """Строки выгрузки; даты - строками ISO 8601 в UTC."""
+    model, fields = EXPORTS[kind]
+    rows = model.objects.order_by('pk')
+    if since:
+        rows = rows.filter(pk__gt=since)
+    if connection.vendor != 'sqlite':
+        return rows.values_list(*fields), _isoformat
+    # SQLite хранит дату текстом: без разбора в datetime и make_aware на
+    # каждой строке выгрузка в несколько раз быстрее.
+    rows = rows.annotate(pub_date_text=Cast('pub_date', CharField()))
+    columns = [
+        'pub_date_text' if field == 'pub_date' else field for field in fields
+    ]
+    return rows.values_list(*columns), _sqlite_isoformat
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _sqlite_isoformat(value):
+    return f'{value[:10]}T{value[11:]}+00:00'
+
+
+def _chunks(kind, since, chunk_size):
+    _, fields = EXPORTS[kind]
+    rows, isoformat = _rows(kind, since)
+    date_index = fields.index('pub_date')
+    rows = rows.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = [list(row) for row in islice(rows, chunk_size)]
+        if not chunk:
+            return
+        for row in chunk:
+            row[date_index] = isoformat(row[date_index])
+        yield chunk
+
+
+def _json_value(value):
+    if isinstance(value, str):
+        return encode_basestring(value)
+    return 'null' if value is None else str(value)
+
+
+def _ndjson(fields, chunk):
+    # Ключи одинаковы во всех строках: они кодируются один раз в шаблоне,
+    # а значения - по столбцам, без обхода словаря на каждой строке.
+    line = ', '.join(f'{encode_basestring(field)}: %s' for field in fields)
+    line = f'{{{line}}}\n'
+    columns = zip(*(map(_json_value, column) for column in zip(*chunk)))
+    return ''.join(line % row for row in columns)
+
+
+def export(kind, format_='ndjson', since=None, chunk_size=CHUNK_SIZE,
+           stats=None):
+    """Куски текста выгрузки kind в формате format_.
+
+    В stats (если передан словарь) накапливаются число строк и id
+    последней строки - since для следующей выгрузки.
+    """
+    _, fields = EXPORTS[kind]
+    if stats is None:
+        stats = {}
+    stats.update(rows=0, last_id=since)
+    if format_ == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        yield buffer.getvalue()
+    for chunk in _chunks(kind, since, chunk_size):
+        if format_ == 'csv':
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+        else:
+            yield _ndjson(fields, chunk)
+        stats['rows'] += len(chunk)
+        stats['last_id'] = chunk[-1][0]
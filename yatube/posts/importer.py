@@ -0,0 +1,291 @@
+"""Массовая загрузка постов, комментариев и подписок из NDJSON и CSV.
+
+Строки вставляются пачками (executemany) в обход save() и сигналов,
+поэтому pub_date из файла сохраняется: auto_now_add не срабатывает.
+Вторичные индексы, полнотекстовый индекс, счетчики и входящие лент
+перестраиваются один раз в конце загрузки (deferred_rebuilds).
+
+Колонки - как у выгрузки (posts.export). Автор, подписчик и группа
+задаются id (author_id, group_id) или именем (author, group): обе формы
+переводятся в id по словарю, загруженному в память одним запросом.
+Строки с неизвестными ссылками пропускаются, строки с уже существующим
+id - тоже, поэтому прерванную загрузку можно повторить.
+"""
+import csv
+import json
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.db.models import DateTimeField
+from django.utils import timezone
+
+from core.cache import bump
+
+from . import counters, search, timeline
+from .lookups import LOOKUPS
+from .models import Comment, Follow, Post
+
+IMPORTS = {'posts': Post, 'comments': Comment, 'follows': Follow}
+FORMATS = ('ndjson', 'csv')
+BATCH_SIZE: int = 10000  # строк в одной транзакции
+QUERY_BATCH_SIZE: int = 500  # id в одном запросе проверки ссылок
+
+
+class IdMap:
+    """Существующие id модели и id по имени (username, slug).
+
+    Пользователи и группы загружаются в память целиком, посты
+    проверяются запросом на каждую пачку.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.lookup = LOOKUPS.get(model)
+        self.ids, self.names = None, {}
+        if self.lookup:
+            self.ids = set()
+            rows = model.objects.values_list('pk', self.lookup)
+            for pk, name in rows.iterator():
+                self.ids.add(pk)
+                self.names[name] = pk
+
+    def value(self, row, field):
+        """id из колонки <field>_id или по имени из колонки <field>."""
+        value = row.get(field.attname)
+        if value not in (None, ''):
+            return int(value)
+        name = row.get(field.name)
+        if name in (None, ''):
+            return None
+        return self.names.get(name, 0)
+
+    def existing(self, ids) -> set:
+        if self.ids is not None:
+            return self.ids.intersection(ids)
+        ids, found = list(ids), set()
+        for start in range(0, len(ids), QUERY_BATCH_SIZE):
+            found.update(
+                self.model.objects.filter(
+                    pk__in=ids[start:start + QUERY_BATCH_SIZE]
+                ).values_list('pk', flat=True)
+            )
+        return found
+
+
+def read_rows(stream, format_):
+    """Словари строк входного файла."""
+    if format_ == 'csv':
+        return csv.DictReader(stream)
+    return (json.loads(line) for line in stream if line.strip())
+
+
+def _insert_sql(model, fields) -> str:
+    ops = connection.ops
+    columns = ', '.join(ops.quote_name(field.column) for field in fields)
+    values = ', '.join(['%s'] * len(fields))
+    return (
+        f'{ops.insert_statement(ignore_conflicts=True)} '
+        f'{ops.quote_name(model._meta.db_table)} ({columns}) '
+        f'VALUES ({values})'
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+
+
+def _db_datetime(value, db):
+    """Дата ISO 8601 (без зоны - UTC) в значение для INSERT."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.utc)
+    if db.vendor == 'sqlite':
+        # Как adapt_datetimefield_value, без лишних проверок.
+        return str(value.astimezone(db.timezone).replace(tzinfo=None))
+    return db.ops.adapt_datetimefield_value(value)
+
+
+class Loader:
+    """Пачки строк файла, вставленные в таблицу модели."""
+
+    def __init__(self, model):
+        self.model = model
+        self.fields = model._meta.concrete_fields
+        self.relations = {
+            field: IdMap(field.related_model)
+            for field in self.fields if field.is_relation
+        }
+        self.converters = [self.converter(field) for field in self.fields]
+        self.own = IdMap(model)
+        # ids - диапазоны id вставленных строк для доставки в ленты.
+        self.stats = {'rows': 0, 'skipped': 0, 'ids': []}
+
+    def converter(self, field):
+        """Функция: значение из файла -> значение для INSERT.
+
+        Для частых типов (id, строки, даты ISO 8601) обходит to_python и
+        get_db_prep_save: на миллионах строк это основная часть времени.
+        """
+        if field.is_relation:
+            relation = self.relations[field]
+            return lambda row: relation.value(row, field)
+        db = transaction.get_connection()
+        blank = '' if field.empty_strings_allowed and field.blank else None
+
+        def convert(row):
+            value = row.get(field.attname)
+            if value is None or value == '':
+                if field.name == 'pub_date':
+                    value = timezone.now()
+                else:
+                    return blank if field.empty_strings_allowed else None
+            if field.primary_key:
+                return int(value)
+            if field.empty_strings_allowed and isinstance(value, str):
+                return value
+            if isinstance(field, DateTimeField):
+                return _db_datetime(value, db)
+            return field.get_db_prep_save(field.to_python(value), db)
+
+        return convert
+
+    def convert(self, row) -> list:
+        """Значения строки для INSERT; ссылки - id без проверки."""
+        return [convert(row) for convert in self.converters]
+
+    def valid(self, rows) -> list:
+        """Строки с заполненными полями и существующими ссылками."""
+        for index, field in enumerate(self.fields[1:], 1):
+            if field.is_relation:
+                ids = {row[index] for row in rows if row[index]}
+                existing = self.relations[field].existing(ids)
+            else:
+                existing = ()
+            rows = [
+                row for row in rows
+                if row[index] is None and field.null
+                or row[index] is not None and not field.is_relation
+                or row[index] in existing
+            ]
+        if self.model is Follow:
+            # Подписка на себя запрещена и в представлениях.
+            names = [field.name for field in self.fields]
+            user, author = names.index('user'), names.index('author')
+            rows = [row for row in rows if row[user] != row[author]]
+        return rows
+
+    def last_pk(self):
+        return self.model.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+
+    def insert(self, rows):
+        converted = [self.convert(row) for row in rows]
+        valid = self.valid(converted)
+        self.stats['skipped'] += len(converted) - len(valid)
+        if not valid:
+            return
+        existing = self.own.existing(
+            row[0] for row in valid if row[0] is not None
+        )
+        with_pk = [
+            row for row in valid
+            if row[0] is not None and row[0] not in existing
+        ]
+        without_pk = [row[1:] for row in valid if row[0] is None]
+        inserted, ids = 0, []
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Новые id выдаются после последнего существующего.
+            first_new = self.last_pk() + 1
+            for fields, batch in (
+                (self.fields, with_pk), (self.fields[1:], without_pk)
+            ):
+                if batch:
+                    cursor.executemany(
+                        _insert_sql(self.model, fields), batch
+                    )
+                    inserted += cursor.rowcount
+            if with_pk:
+                ids = [row[0] for row in with_pk]
+                if inserted < len(with_pk) + len(without_pk):
+                    # Часть строк пропущена по другому ограничению
+                    # уникальности, например повторная подписка.
+                    ids = list(self.own.existing(ids))
+            if without_pk:
+                ids.extend(range(first_new, self.last_pk() + 1))
+        self.stats['rows'] += inserted
+        self.stats['skipped'] += len(valid) - inserted
+        self.stats['ids'] = _ranges(self.stats['ids'], ids)
+
+
+def _ranges(ranges, ids) -> list:
+    """Диапазоны (первый, последний) с добавленными id, без разрывов."""
+    merged = []
+    for first, last in sorted([*ranges, *((pk, pk) for pk in ids)]):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return [tuple(pair) for pair in merged]
+
+
+@contextmanager
+def deferred_rebuilds(model, stats, drop_indexes=True):
+    """Перестраивает индексы, счетчики и входящие после загрузки model.
+
+    Перестройка выполняется и после ошибки: уже вставленные пачки
+    остаются в базе. drop_indexes=False сохраняет вторичные индексы на
+    время загрузки (для загрузки в работающую базу).
+    """
+    indexes = model._meta.indexes if drop_indexes else []
+    # Редактор схемы без блока with: на SQLite выход из него проверяет
+    # внешние ключи во всей базе, а для DROP/CREATE INDEX это не нужно.
+    editor = connection.schema_editor()
+    for index in indexes:
+        editor.remove_index(model, index)
+    try:
+        if model is Post:
+            with search.deferred_index():
+                yield
+        else:
+            yield
+    finally:
+        for index in indexes:
+            editor.add_index(model, index)
+        counters.rebuild([
+            name for name, (counted, _) in counters.COUNTERS.items()
+            if counted is model
+        ])
+        if model is not Comment:
+            key = 'post_ids' if model is Post else 'follow_ids'
+            for ids in stats['ids']:
+                timeline.deliver_imported(**{key: ids})
+        bump('posts', 'comments')
+
+
+def load_rows(kind, rows, batch_size=BATCH_SIZE, drop_indexes=True,
+              progress=None):
+    """Загружает строки kind (словари колонок) и возвращает статистику.
+
+    progress(stats) вызывается после каждой пачки, последний раз - до
+    перестройки индексов, счетчиков и лент.
+    """
+    model = IMPORTS[kind]
+    loader = Loader(model)
+    with deferred_rebuilds(model, loader.stats, drop_indexes):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                loader.insert(batch)
+                batch = []
+                if progress:
+                    progress(loader.stats)
+        loader.insert(batch)
+        if progress:
+            progress(loader.stats)
+    return loader.stats
+
+
+def load(kind, stream, format_='ndjson', **kwargs):
+    """Загружает строки kind из файла stream (см. load_rows)."""
+    return load_rows(kind, read_rows(stream, format_), **kwargs)
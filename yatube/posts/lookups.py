@@ -0,0 +1,73 @@
+"""Кэш частых поисков: пользователь по username и группа по slug.
+
+Найденный объект хранится в кэше, поэтому повторное обращение к профилю
+или группе не выполняет запрос. Ненайденное имя запоминается меткой
+MISSING на короткое время, и перебор несуществующих адресов не доходит
+до базы. Сигналы удаляют записи при сохранении и удалении объектов.
+
+Промах читается из default: значение с отставшей реплики осталось бы
+в кэше на весь срок (core.db_router).
+"""
+from urllib.parse import quote
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import Http404
+
+from core import db_router
+from .models import Group
+
+User = get_user_model()
+
+# Модель: поле, по которому ищется объект.
+LOOKUPS = {User: 'username', Group: 'slug'}
+MISSING = 'missing'
+CACHE_TIMEOUT: int = 60 * 60
+MISSING_CACHE_TIMEOUT: int = 60
+
+
+def _key(model, value) -> str:
+    return f'lookup:{model._meta.label_lower}:{quote(str(value))}'
+
+
+def get_or_404(model, value):
+    """Объект модели по значению поля из LOOKUPS или Http404."""
+    key = _key(model, value)
+    obj = cache.get(key)
+    if obj is None:
+        with db_router.use_primary():
+            obj = model.objects.filter(**{LOOKUPS[model]: value}).first()
+        if obj is None:
+            cache.set(key, MISSING, MISSING_CACHE_TIMEOUT)
+        else:
+            cache.set(key, obj, CACHE_TIMEOUT)
+    if obj is None or obj == MISSING:
+        raise Http404(f'{model._meta.verbose_name} не найден(а)')
+    return obj
+
+
+def user_or_404(username):
+    return get_or_404(User, username)
+
+
+def group_or_404(slug):
+    return get_or_404(Group, slug)
+
+
+def saved_value(instance, update_fields=None):
+    """Значение поля поиска в базе до сохранения instance (или None)."""
+    field = LOOKUPS[type(instance)]
+    if instance._state.adding or (
+        update_fields is not None and field not in update_fields
+    ):
+        return None
+    return type(instance).objects.filter(pk=instance.pk).values_list(
+        field, flat=True
+    ).first()
+
+
+def forget(instance, *values):
+    """Удаляет из кэша объект instance и записи по значениям values."""
+    model = type(instance)
+    values += (getattr(instance, LOOKUPS[model]),)
+    cache.delete_many({_key(model, value) for value in values if value})
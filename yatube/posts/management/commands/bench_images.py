@@ -0,0 +1,124 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageDraw, ImageFilter
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.parsers import parse_geometry
+
+from posts.thumbnails import _resolve_options, variants
+
+# Прежние миниатюры шаблонов: PNG с растягиванием.
+LEGACY_SIZES = {
+    'feed': ('960x339', {'crop': 'center', 'format': 'PNG', 'upscale': True}),
+    'detail': ('1920x1080', {'format': 'PNG', 'upscale': True}),
+}
+# Изображений на странице: лента из 10 постов, страница поста.
+IMAGES_PER_PAGE = {'feed': 10, 'detail': 1}
+
+
+def make_photo(path, width, height):
+    """Шумное изображение с градиентом: сжимается примерно как фото."""
+    image = Image.new('RGB', (width, height))
+    draw = ImageDraw.Draw(image)
+    for y in range(height):
+        draw.line(
+            [(0, y), (width, y)],
+            fill=(y * 255 // height, 120, 255 - y * 255 // height)
+        )
+    random.seed(0)
+    for _ in range(width * height // 50):
+        x, y = random.randrange(width), random.randrange(height)
+        radius = random.randint(1, 6)
+        draw.ellipse(
+            [x, y, x + radius, y + radius],
+            fill=tuple(random.randrange(256) for _ in range(3))
+        )
+    image.filter(ImageFilter.GaussianBlur(1)).save(path, quality=95)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает размер и время сжатия прежних PNG-миниатюр и '
+        'адаптивных вариантов изображений постов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--image',
+            help='Исходное изображение (по умолчанию - синтетическое)'
+        )
+        parser.add_argument('--width', type=int, default=3000)
+        parser.add_argument('--height', type=int, default=2000)
+
+    def encode(self, source, geometry_string, options):
+        """Размер результата и время sorl: масштабирование и сжатие."""
+        engine = default.engine
+        options = _resolve_options(source, options)
+        started = time.perf_counter()
+        image = engine.get_image(source)
+        options['image_info'] = engine.get_image_info(image)
+        geometry = parse_geometry(
+            geometry_string, engine.get_image_ratio(image, options)
+        )
+        thumbnail = engine.create(image, geometry, options)
+        raw_data = engine._get_raw_data(
+            thumbnail, options['format'], options['quality'],
+            image_info=options['image_info'],
+            progressive=options.get('progressive', True)
+        )
+        elapsed = time.perf_counter() - started
+        return len(raw_data), elapsed, engine.get_image_size(thumbnail)[0]
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            path = options['image']
+            if not path:
+                path = os.path.join(directory, 'photo.jpg')
+                make_photo(path, options['width'], options['height'])
+            storage = FileSystemStorage(location=os.path.dirname(path))
+            source = ImageFile(os.path.basename(path), storage)
+            for size, (geometry, legacy_options) in LEGACY_SIZES.items():
+                self.report(size, source, geometry, legacy_options)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def report(self, size, source, legacy_geometry, legacy_options):
+        legacy_bytes, legacy_time, _ = self.encode(
+            source, legacy_geometry, legacy_options
+        )
+        self.stdout.write(
+            f'{size}: PNG {legacy_geometry}: {legacy_bytes // 1024} КБ, '
+            f'{legacy_time * 1000:.0f} мс'
+        )
+        total_time = 0
+        smallest = {}
+        for geometry, variant_options in variants(size):
+            variant_bytes, elapsed, width = self.encode(
+                source, geometry, variant_options
+            )
+            total_time += elapsed
+            smallest[width] = min(
+                smallest.get(width, variant_bytes), variant_bytes
+            )
+            self.stdout.write(
+                f'  {variant_options["format"]} {geometry}: '
+                f'{variant_bytes // 1024} КБ, {elapsed * 1000:.0f} мс'
+            )
+        self.stdout.write(
+            f'  все варианты: {total_time * 1000:.0f} мс '
+            f'(PNG: {legacy_time * 1000:.0f} мс)'
+        )
+        images = IMAGES_PER_PAGE[size]
+        for width, variant_bytes in sorted(smallest.items()):
+            self.stdout.write(
+                f'  изображения страницы при ширине {width}: '
+                f'{images * variant_bytes // 1024} КБ вместо '
+                f'{images * legacy_bytes // 1024} КБ'
+            )
@@ -0,0 +1,187 @@
+import os
+import queue
+import random
+import sqlite3
+import tempfile
+import time
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from core.db_backends.sqlite3.base import PRAGMAS, apply_pragmas
+from posts.benchmark import percentile
+from posts.models import Comment, Post
+
+# Профиль: (PRAGMA, режим BEGIN транзакций записи).
+PROFILES = {
+    'default': (
+        {'journal_mode': 'DELETE', 'synchronous': 'FULL',
+         'busy_timeout': 5000},
+        'DEFERRED'
+    ),
+    'tuned': (PRAGMAS, 'IMMEDIATE'),
+}
+
+
+def _is_locked(error) -> bool:
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+def _read(cursor, sql, last_id, rng):
+    cursor.execute(sql, (rng.randint(1, last_id),))
+    cursor.fetchall()
+
+
+def _write(cursor, sql, last_id, rng, begin):
+    # Как add_comment: сначала чтение поста, затем запись в транзакции.
+    cursor.execute(f'BEGIN {begin}')
+    try:
+        post_id = rng.randint(1, last_id)
+        cursor.execute(
+            f'SELECT author_id FROM {Post._meta.db_table} WHERE id = ?',
+            (post_id,)
+        )
+        row = cursor.fetchone()
+        if row:
+            cursor.execute(sql, (
+                post_id, row[0], 'Комментарий из замера',
+                str(timezone.now().replace(tzinfo=None))
+            ))
+        cursor.execute('COMMIT')
+    except sqlite3.OperationalError:
+        cursor.execute('ROLLBACK')
+        raise
+
+
+def worker(kind, path, profile, sql, last_id, seconds, seed, results):
+    """Выполняет запросы kind до истечения seconds и отдает итог."""
+    pragmas, begin = PROFILES[profile]
+    # PRAGMA ждут блокировку уже запущенных писателей; дальше ожидание
+    # задает busy_timeout профиля.
+    database = sqlite3.connect(path, isolation_level=None, timeout=30)
+    apply_pragmas(database, pragmas)
+    cursor = database.cursor()
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if kind == 'read':
+                _read(cursor, sql, last_id, rng)
+            else:
+                _write(cursor, sql, last_id, rng, begin)
+        except sqlite3.OperationalError as error:
+            if not _is_locked(error):
+                raise
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    results.put((kind, latencies, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Пропускная способность чтения ленты SQLite без записи и во время '
+        'записи комментариев: профили default (журнал DELETE) и tuned '
+        '(WAL и PRAGMA core.db_backends.sqlite3). Замер идет на копии '
+        'базы во временном каталоге'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Длительность каждого замера'
+        )
+        parser.add_argument(
+            '--profiles', nargs='+', choices=PROFILES, default=list(PROFILES)
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда только для SQLite')
+        last_id = (Post.objects.order_by('-pk').first() or Post()).pk
+        if not last_id:
+            raise CommandError(
+                'Нет постов: заполните базу командой seed_benchmark_data'
+            )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.sqlite3')
+            self.copy_database(path)
+            self.stdout.write(
+                f'{"профиль":<8} {"писателей":>9} {"чтений/с":>9} '
+                f'{"p95 чт., мс":>11} {"записей/с":>9} {"блокировок":>10}'
+            )
+            for profile in options['profiles']:
+                self.set_journal_mode(path, profile)
+                for writers in (0, options['writers']):
+                    self.measure(path, profile, last_id, writers, options)
+
+    def copy_database(self, path):
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        connection.connection.backup(target)
+        target.close()
+
+    def set_journal_mode(self, path, profile):
+        # Режим журнала хранится в файле; меняется без других соединений.
+        database = sqlite3.connect(path, isolation_level=None)
+        mode = PROFILES[profile][0].get('journal_mode', 'DELETE')
+        database.execute(f'PRAGMA journal_mode = {mode}')
+        database.close()
+
+    def queries(self):
+        read_sql, _ = (
+            Post.objects.select_related('author', 'group')
+            .filter(pk__lt=0).order_by('-pk')[:10]
+            .query.sql_with_params()
+        )
+        write_sql = (
+            f'INSERT INTO {Comment._meta.db_table} '
+            '(post_id, author_id, text, pub_date) VALUES (?, ?, ?, ?)'
+        )
+        return read_sql.replace('%s', '?'), write_sql
+
+    def measure(self, path, profile, last_id, writers, options):
+        context = get_context('fork')
+        results = context.Queue()
+        read_sql, write_sql = self.queries()
+        processes = [
+            context.Process(target=worker, args=(
+                kind, path, profile, sql, last_id, options['seconds'],
+                number, results
+            ))
+            for number, (kind, sql) in enumerate(
+                [('read', read_sql)] * options['readers']
+                + [('write', write_sql)] * writers
+            )
+        ]
+        for process in processes:
+            process.start()
+        totals = {'read': ([], 0), 'write': ([], 0)}
+        for _ in processes:
+            try:
+                kind, latencies, errors = results.get(
+                    timeout=options['seconds'] + 60
+                )
+            except queue.Empty:
+                raise CommandError('Процесс замера не ответил')
+            before, count = totals[kind]
+            totals[kind] = (before + latencies, count + errors)
+        for process in processes:
+            process.join()
+        self.report(profile, writers, totals, options['seconds'])
+
+    def report(self, profile, writers, totals, seconds):
+        reads, read_errors = totals['read']
+        writes, write_errors = totals['write']
+        p95 = percentile(reads, 95) * 1000 if reads else 0
+        self.stdout.write(
+            f'{profile:<8} {writers:>9} {len(reads) / seconds:>9.0f} '
+            f'{p95:>11.2f} {len(writes) / seconds:>9.0f} '
+            f'{read_errors + write_errors:>10}'
+        )
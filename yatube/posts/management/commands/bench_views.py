@@ -0,0 +1,109 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+COLUMNS = (
+    'requests', 'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'rps', 'errors'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку, число SQL-запросов и пропускную способность '
+        'представлений и сравнивает их с базовой линией'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*',
+            help=f'Сценарии (по умолчанию - все): '
+                 f'{", ".join(benchmark.SCENARIOS)}'
+        )
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--url', help='Адрес запущенного сервера (по умолчанию - '
+                          'тестовый клиент в этом процессе)'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Параллельных запросов (только с --url)'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом'
+        )
+        parser.add_argument('--save', help='Сохранить результат в JSON')
+        parser.add_argument(
+            '--baseline', help='Сравнить с сохраненным результатом'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=benchmark.TOLERANCE,
+            help='Допустимый рост p95 (доля)'
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(benchmark.SCENARIOS)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}'
+            )
+        if options['requests'] < 2:
+            raise CommandError('Для перцентилей нужно хотя бы 2 запроса')
+        if options['concurrency'] > 1 and not options['url']:
+            raise CommandError('--concurrency работает только с --url')
+        try:
+            results = benchmark.run(
+                options['scenarios'], options['requests'],
+                options['warmup'], options['seed'], options['url'],
+                options['concurrency'], options['cold']
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        self.print_table(results)
+        run_options = {
+            name: options[name] for name in (
+                'requests', 'warmup', 'seed', 'url', 'concurrency', 'cold'
+            )
+        }
+        if options['save']:
+            benchmark.save(
+                options['save'], results,
+                dataset=benchmark.dataset(), options=run_options
+            )
+        if options['baseline']:
+            self.check_baseline(
+                results, options['baseline'], options['tolerance'],
+                run_options
+            )
+
+    def print_table(self, results):
+        self.stdout.write(
+            f'{"":<14}' + ''.join(f'{column:>10}' for column in COLUMNS)
+        )
+        for name, summary in results.items():
+            self.stdout.write(f'{name:<14}' + ''.join(
+                f'{"-" if summary[column] is None else summary[column]:>10}'
+                for column in COLUMNS
+            ))
+
+    def check_baseline(self, results, path, tolerance, run_options):
+        try:
+            baseline = benchmark.load(path)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        if baseline['meta'].get('options') != run_options:
+            self.stderr.write(self.style.WARNING(
+                'Параметры замера отличаются от базовой линии: '
+                f'{baseline["meta"].get("options")}'
+            ))
+        regressions = benchmark.compare(
+            results, baseline['results'], tolerance
+        )
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно базовой линии:\n'
+                + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,123 @@
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.paginator import encode_cursor, get_page
+from posts import counters, timeline
+from posts.models import Follow, Group, Post
+from posts.views import POSTS_COUNT, comment_page
+
+User = get_user_model()
+
+# Признаки плана без подходящего индекса.
+BAD_STEPS = ('USE TEMP B-TREE',)
+
+
+def is_full_scan(detail) -> bool:
+    """SCAN таблицы без индекса (SCAN по индексу допустим)."""
+    return detail.startswith('SCAN ') and ' INDEX' not in detail
+
+
+def feed_pages(get_feed_page):
+    """Первая, следующая, предыдущая и нумерованная страницы ленты."""
+    cursor = encode_cursor(
+        Post(pk=1, pub_date=timezone.make_aware(datetime(2000, 1, 1)))
+    )
+    factory = RequestFactory()
+    for params in ({}, {'after': cursor}, {'before': cursor}, {'page': 2}):
+        list(get_feed_page(factory.get('/', params)))
+
+
+def access_paths():
+    """Запросы лент и страницы поста по имени пути доступа."""
+    user = User(pk=1, username='user')
+    group = Group(pk=1, slug='group')
+    post = Post(pk=1, author=user)
+    return {
+        'index': lambda: feed_pages(
+            lambda request: get_page(
+                request, Post.objects.for_feed(), POSTS_COUNT
+            )
+        ),
+        'group': lambda: feed_pages(
+            lambda request: get_page(
+                request, group.posts.for_feed(), POSTS_COUNT
+            )
+        ),
+        'profile': lambda: feed_pages(
+            lambda request: get_page(
+                request, user.posts.for_feed(), POSTS_COUNT
+            )
+        ),
+        'follow': lambda: feed_pages(
+            lambda request: timeline.feed_page(request, user, POSTS_COUNT)
+        ),
+        'post_detail': lambda: (
+            counters.of('user', user.pk),
+            feed_pages(lambda request: comment_page(request, post)),
+        ),
+        'following': lambda: (
+            Follow.objects.filter(user=user, author=user).exists(),
+            list(Follow.objects.filter(user=user).values_list('author')),
+        ),
+        'followers': lambda: list(
+            Follow.objects.filter(author=user).values_list('user')
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN QUERY PLAN для запросов лент и страницы '
+        'поста и завершается ошибкой, если запрос читает всю таблицу '
+        'или сортирует во временном B-дереве'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Проверяемые пути доступа (по умолчанию - все)'
+        )
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Проверка планов поддерживает только SQLite')
+        paths = access_paths()
+        unknown = set(options['paths']) - set(paths)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные пути доступа: {", ".join(sorted(unknown))}'
+            )
+        failures = 0
+        for name in options['paths'] or paths:
+            with CaptureQueriesContext(connection) as queries:
+                paths[name]()
+            for query in queries:
+                plan = self.explain(query['sql'])
+                bad = [
+                    step for step in plan
+                    if is_full_scan(step)
+                    or any(marker in step for marker in BAD_STEPS)
+                ]
+                failures += bool(bad)
+                style = self.style.ERROR if bad else self.style.SUCCESS
+                self.stdout.write(style(
+                    f'{name}: {"FAIL" if bad else "OK"}'
+                ))
+                self.stdout.write(f'  {query["sql"]}')
+                for step in plan:
+                    self.stdout.write(f'    {step}')
+        if failures:
+            raise CommandError(
+                f'Запросов без подходящего индекса: {failures}'
+            )
@@ -0,0 +1,48 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.export import CHUNK_SIZE, EXPORTS, FORMATS, export
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты или комментарии в NDJSON или CSV потоком, '
+        'с постоянным расходом памяти'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=EXPORTS)
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument(
+            '--since', type=int,
+            help='Выгрузить строки с id больше указанного'
+        )
+        parser.add_argument(
+            '--output', help='Файл выгрузки (по умолчанию - stdout)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        output = (
+            open(options['output'], 'w', encoding='utf-8', newline='')
+            if options['output'] else sys.stdout
+        )
+        stats = {}
+        started = time.perf_counter()
+        try:
+            for text in export(
+                options['kind'], options['format'], options['since'],
+                options['chunk_size'], stats
+            ):
+                output.write(text)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        elapsed = time.perf_counter() - started
+        self.stderr.write(
+            f'{stats["rows"]} строк за {elapsed:.2f} с '
+            f'({stats["rows"] / elapsed:,.0f} строк/с), '
+            f'следующий --since {stats["last_id"] or 0}'
+        )
@@ -0,0 +1,60 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.importer import BATCH_SIZE, FORMATS, IMPORTS, load
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии или подписки из NDJSON или CSV '
+        'пачками в обход save(), сохраняя исходные даты публикации'
+    )
+    stealth_options = ('stdin',)
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=IMPORTS)
+        parser.add_argument(
+            'input', nargs='?', help='Файл (по умолчанию - stdin)'
+        )
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--keep-indexes', action='store_true',
+            help='Не удалять вторичные индексы на время загрузки'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        loaded = started
+
+        def report(stats):
+            nonlocal loaded
+            loaded = time.perf_counter()
+            elapsed = loaded - started
+            self.stderr.write(
+                f'{stats["rows"]} строк за {elapsed:.2f} с '
+                f'({stats["rows"] / elapsed:,.0f} строк/с), '
+                f'пропущено {stats["skipped"]}'
+            )
+
+        stdin = options.get('stdin', sys.stdin)  # для тестов
+        stream = (
+            open(options['input'], encoding='utf-8', newline='')
+            if options['input'] else stdin
+        )
+        try:
+            stats = load(
+                options['kind'], stream, options['format'],
+                batch_size=options['batch_size'],
+                drop_indexes=not options['keep_indexes'], progress=report
+            )
+        finally:
+            if stream is not stdin:
+                stream.close()
+        self.stdout.write(
+            f'Загружено {stats["rows"]}, пропущено {stats["skipped"]}; '
+            'индексы, счетчики и ленты перестроены за '
+            f'{time.perf_counter() - loaded:.2f} с'
+        )
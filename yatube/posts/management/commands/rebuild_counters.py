@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счетчики (посты, подписчики, '
+        'комментарии) по данным и исправляет расхождения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*',
+            help='Счетчики (по умолчанию - все): '
+                 f'{", ".join(counters.COUNTERS)}'
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - set(counters.COUNTERS)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные счетчики: {", ".join(sorted(unknown))}'
+            )
+        fixed = counters.rebuild(options['names'])
+        for name, count in fixed.items():
+            self.stdout.write(f'{name}: исправлено {count}')
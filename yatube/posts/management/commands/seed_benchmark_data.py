@@ -0,0 +1,205 @@
+import io
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from posts import importer, thumbnails
+from posts.models import Group, Post
+
+User = get_user_model()
+
+TEXTS: int = 500  # разных текстов постов и комментариев
+IMAGES: int = 10  # разных изображений
+ZIPF_EXPONENT: float = 1.1
+USERNAME_PREFIX = 'bench'
+
+
+class PowerLaw:
+    """Случайный выбор с весом 1 / rank ** exponent (закон Ципфа).
+
+    Немногие популярные авторы собирают большую часть подписчиков,
+    постов и комментариев, как в настоящей социальной сети.
+    """
+
+    def __init__(self, items, rng, exponent=ZIPF_EXPONENT):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ))
+        self.rng = rng
+
+    def choices(self, k):
+        return self.rng.choices(self.items, cum_weights=self.weights, k=k)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает синтетические данные для замеров: пользователей, группы, '
+        'подписки со степенным распределением, посты с изображениями и '
+        'комментарии'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=50000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя'
+        )
+        parser.add_argument(
+            '--images', type=float, default=0.1,
+            help='Доля постов с изображением'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределены даты'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.started = time.perf_counter()
+        self.texts = [
+            self.fake.sentence(nb_words=self.rng.randint(5, 40))
+            for _ in range(TEXTS)
+        ]
+        user_ids = self.create_users(options['users'])
+        group_ids = self.create_groups(options['groups'])
+        popular = PowerLaw(user_ids, self.rng)
+        self.load('follows', self.follows(
+            user_ids, popular, options['follows']
+        ))
+        start = timezone.now() - timedelta(days=options['days'])
+        step = timedelta(days=options['days']) / max(options['posts'], 1)
+        images = self.create_images(options['images'])
+        first_id = (Post.objects.order_by('-pk').first() or Post()).pk or 0
+        posts = [
+            (first_id + number + 1, start + step * number)
+            for number in range(options['posts'])
+        ]
+        # Активность авторов не зависит от числа их подписчиков.
+        active = PowerLaw(user_ids, self.rng)
+        self.load('posts', self.posts(
+            posts, active, group_ids, images, options['images']
+        ))
+        self.load('comments', self.comments(
+            posts, user_ids, options['comments']
+        ))
+        # Варианты изображений создаются в фоне, когда загрузка уже не
+        # держит блокировку записи SQLite.
+        for name in images:
+            thumbnails.pregenerate(Post(image=name).image)
+
+    def report(self, message):
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(f'[{elapsed:7.1f} с] {message}')
+
+    def create_users(self, count):
+        first = User.objects.count()
+        password = make_password(None)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'{USERNAME_PREFIX}{first + number}',
+                    first_name=self.fake.first_name(),
+                    last_name=self.fake.last_name(),
+                    password=password,
+                )
+                for number in range(count)
+            ),
+            batch_size=importer.QUERY_BATCH_SIZE
+        )
+        self.report(f'users: {count}')
+        return list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX)
+            .values_list('pk', flat=True)
+        )
+
+    def create_groups(self, count):
+        first = Group.objects.count()
+        Group.objects.bulk_create(
+            Group(
+                title=self.fake.sentence(nb_words=3)[:200],
+                slug=f'{USERNAME_PREFIX}-{first + number}',
+                description=self.rng.choice(self.texts),
+            )
+            for number in range(count)
+        )
+        self.report(f'groups: {count}')
+        return list(Group.objects.values_list('pk', flat=True))
+
+    def create_images(self, share):
+        """Несколько изображений, общих для постов."""
+        if not share:
+            return []
+        names = []
+        for number in range(IMAGES):
+            buffer = io.BytesIO()
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            Image.new('RGB', (1920, 1080), color).save(buffer, 'JPEG')
+            name = default_storage.save(
+                f'posts/{USERNAME_PREFIX}-{number}.jpg',
+                ContentFile(buffer.getvalue())
+            )
+            names.append(name)
+        return names
+
+    def follows(self, user_ids, popular, mean):
+        # Число подписок у пользователей тоже неравномерно: экспонента.
+        for user_id in user_ids:
+            count = min(int(self.rng.expovariate(1 / mean)), len(user_ids))
+            for author_id in set(popular.choices(count)):
+                yield {'user_id': user_id, 'author_id': author_id}
+
+    def posts(self, posts, active, group_ids, images, image_share):
+        authors = active.choices(len(posts))
+        for (post_id, pub_date), author_id in zip(posts, authors):
+            yield {
+                'id': post_id,
+                'pub_date': pub_date,
+                'author_id': author_id,
+                'group_id': (
+                    self.rng.choice(group_ids)
+                    if group_ids and self.rng.random() < 0.5 else None
+                ),
+                'text': self.rng.choice(self.texts),
+                'image': (
+                    self.rng.choice(images)
+                    if images and self.rng.random() < image_share else ''
+                ),
+            }
+
+    def comments(self, posts, user_ids, count):
+        if not posts:
+            return
+        # Обсуждают в основном популярные посты.
+        commented = PowerLaw(posts, self.rng).choices(count)
+        now = timezone.now()
+        for post_id, pub_date in commented:
+            yield {
+                'post_id': post_id,
+                'author_id': self.rng.choice(user_ids),
+                'pub_date': min(now, pub_date + timedelta(
+                    minutes=self.rng.randint(1, 60 * 24)
+                )),
+                'text': self.rng.choice(self.texts),
+            }
+
+    def load(self, kind, rows):
+        stats = importer.load_rows(kind, rows)
+        self.report(f'{kind}: {stats["rows"]}')
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:33
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# Счетчик: (модель, поле), как в posts/counters.py на момент миграции.
+COUNTERS = {
+    'user.posts': ('Post', 'author'),
+    'user.followers': ('Follow', 'author'),
+    'user.following': ('Follow', 'user'),
+    'group.posts': ('Post', 'group'),
+    'post.comments': ('Comment', 'post'),
+}
+
+
+def fill_counters(apps, schema_editor):
+    Counter = apps.get_model('posts', 'Counter')
+    for name, (model_name, field) in COUNTERS.items():
+        model = apps.get_model('posts', model_name)
+        rows = (
+            model.objects.filter(**{f'{field}__isnull': False})
+            .values_list(field).annotate(Count('pk')).order_by()
+        )
+        Counter.objects.bulk_create(
+            (
+                Counter(name=name, object_id=object_id, value=value)
+                for object_id, value in rows.iterator()
+            ),
+            batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, verbose_name='Счетчик')),
+                ('object_id', models.IntegerField(verbose_name='Объект')),
+                ('value', models.IntegerField(default=0, verbose_name='Значение')),
+            ],
+            options={
+                'verbose_name': 'Счетчик',
+                'verbose_name_plural': 'Счетчики',
+                'unique_together': {('name', 'object_id')},
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
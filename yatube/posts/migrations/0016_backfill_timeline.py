@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import migrations
+
+# Порог рассылки, как в posts/timeline.py на момент миграции.
+FANOUT_LIMIT = 1000
+
+
+def backfill_timelines(apps, schema_editor):
+    """Входящие для подписок, созданных до появления TimelineEntry.
+
+    Тот же INSERT ... SELECT, что в timeline.deliver_imported, по всем
+    подпискам; посты pull-авторов не копируются.
+    """
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    Counter = apps.get_model('posts', 'Counter')
+    ops = schema_editor.connection.ops
+    sql = (
+        f'{ops.insert_statement(ignore_conflicts=True)} '
+        f'{TimelineEntry._meta.db_table} (user_id, post_id, pub_date) '
+        f'SELECT f.user_id, p.id, p.pub_date '
+        f'FROM {Follow._meta.db_table} f '
+        f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+        f'WHERE f.author_id NOT IN ('
+        f'SELECT object_id FROM {Counter._meta.db_table} '
+        f'WHERE name = %s AND value > %s) '
+        f'ORDER BY f.user_id, p.pub_date'
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    limit = getattr(settings, 'TIMELINE_FANOUT_LIMIT', FANOUT_LIMIT)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql, ['user.followers', limit])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_counter'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
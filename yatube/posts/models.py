@@ -6,6 +6,20 @@ from core.models import CreatedModel
 User = get_user_model()
 
 
+# Поля поста, которые выводит карточка в ленте.
+FEED_FIELDS = (
+    'text', 'pub_date', 'image', 'author', 'group',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug', 'group__title',
+)
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты с автором и группой: ровно то, что выводит карточка."""
+        return self.select_related('author', 'group').only(*FEED_FIELDS)
+
+
 class Post(CreatedModel):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -34,8 +48,20 @@ class Post(CreatedModel):
         blank=True
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-pub_date']
+        # Ленты: главная, группы и профиля - по (pub_date, id).
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_date_idx'),
+            models.Index(
+                fields=['author', 'pub_date'], name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=['group', 'pub_date'], name='post_group_date_idx'
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -77,6 +103,11 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['post', 'pub_date'], name='comment_post_date_idx'
+            ),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -103,3 +134,60 @@ class Follow(CreatedModel):
 
     class Meta:
         unique_together = ('user', 'author')
+        # Подписчики автора читаются только из индекса (рассылка постов).
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Пост, доставленный в ленту подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    # Копия даты поста: лента читается одним диапазоном индекса.
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        ordering = ['-pub_date']
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='timeline_user_date_idx'
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+
+    def __str__(self):
+        return f'{self.user} - {self.post}'
+
+
+class Counter(models.Model):
+    """Денормализованный счетчик, например число постов автора.
+
+    Строки нет - значение равно нулю. Список счетчиков - в counters.py.
+    """
+    name = models.CharField('Счетчик', max_length=32)
+    object_id = models.IntegerField('Объект')
+    value = models.IntegerField('Значение', default=0)
+
+    class Meta:
+        unique_together = ('name', 'object_id')
+        verbose_name = 'Счетчик'
+        verbose_name_plural = 'Счетчики'
+
+    def __str__(self):
+        return f'{self.name}:{self.object_id} = {self.value}'
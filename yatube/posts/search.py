@@ -0,0 +1,135 @@
+"""Полнотекстовый поиск по постам (SQLite FTS5).
+
+Индекс posts_post_fts создается миграцией 0013 и обновляется триггерами.
+Результаты упорядочены по релевантности bm25 и выдаются страницами по
+ключу (rank, rowid), без OFFSET.
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.encoding import force_bytes, force_text
+from django.utils.html import escape
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+WORD_RE = re.compile(r'\w+')
+# Служебные символы вокруг совпадений: в тексте поста их не бывает.
+MATCH_START, MATCH_END = '\x02', '\x03'
+SNIPPET_TOKENS: int = 16
+
+SEARCH_SQL = (
+    'SELECT rowid, rank, snippet(posts_post_fts, 0, %s, %s, %s, %s) '
+    'FROM posts_post_fts '
+    'WHERE posts_post_fts MATCH %s{after} '
+    'ORDER BY rank, rowid LIMIT %s'
+)
+INSERT_TRIGGER_SQL = (
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert"
+    " AFTER INSERT ON posts_post BEGIN"
+    " INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);"
+    " END"
+)
+IDS_SQL = (
+    'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s'
+)
+
+
+def match_expression(query) -> str:
+    """Запрос FTS5 из слов пользователя: все слова, последнее - префикс.
+
+    Синтаксис FTS5 (кавычки, AND, NEAR) из ввода не принимается.
+    """
+    words = WORD_RE.findall(query)
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def encode_cursor(rank, rowid) -> str:
+    return urlsafe_base64_encode(force_bytes(f'{rank!r}|{rowid}'))
+
+
+def decode_cursor(token):
+    try:
+        rank, rowid = force_text(urlsafe_base64_decode(token)).split('|')
+        return float(rank), int(rowid)
+    except (TypeError, ValueError):
+        return None
+
+
+def highlight(snippet):
+    """Экранированный фрагмент текста с совпадениями в <mark>."""
+    return mark_safe(
+        escape(snippet)
+        .replace(MATCH_START, '<mark>')
+        .replace(MATCH_END, '</mark>')
+    )
+
+
+def search(query, per_page, after=None):
+    """Посты, подходящие под запрос, и курсор следующей страницы.
+
+    У каждого поста есть атрибут snippet с подсвеченными совпадениями.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+    params = [MATCH_START, MATCH_END, '…', SNIPPET_TOKENS, expression]
+    after_key = after and decode_cursor(after)
+    if after_key:
+        params.extend(after_key)
+    params.append(per_page + 1)
+    sql = SEARCH_SQL.format(
+        after=' AND (rank, rowid) > (%s, %s)' if after_key else ''
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = Post.objects.for_feed().in_bulk([row[0] for row in rows])
+    results = []
+    for rowid, rank, snippet in rows:
+        if rowid in posts:
+            post = posts[rowid]
+            post.snippet = highlight(snippet)
+            results.append(post)
+    next_cursor = None
+    if has_next:
+        rowid, rank, _ = rows[-1]
+        next_cursor = encode_cursor(rank, rowid)
+    return results, next_cursor
+
+
+def matching_ids(query):
+    """Подзапрос id постов, подходящих под запрос (для фильтров ORM)."""
+    return RawSQL(IDS_SQL, [match_expression(query)])
+
+
+@contextmanager
+def deferred_index():
+    """Не индексирует вставляемые посты, а перестраивает индекс в конце.
+
+    Для массовой загрузки: одна перестройка быстрее, чем обновление
+    индекса триггером на каждой строке.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TRIGGER IF EXISTS posts_post_fts_insert')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(INSERT_TRIGGER_SQL)
+            cursor.execute(
+                "INSERT INTO posts_post_fts(posts_post_fts) "
+                "VALUES ('rebuild')"
+            )
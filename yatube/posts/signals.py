@@ -0,0 +1,115 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump
+from . import counters, lookups, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+# Счетчики обновляются первыми: рассылка постов читает число подписчиков.
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Follow)
+def count_created(sender, instance, created, **kwargs):
+    """Учитывает новую запись в счетчиках."""
+    if created:
+        counters.track(instance, 1)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Follow)
+def count_deleted(sender, instance, **kwargs):
+    """Убирает удаленную запись из счетчиков."""
+    counters.track(instance, -1)
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, update_fields=None, **kwargs):
+    """Запоминает прежнюю группу редактируемого поста."""
+    if instance._state.adding or (
+        update_fields is not None and 'group' not in update_fields
+    ):
+        return
+    instance._saved_group_id = Post.objects.filter(
+        pk=instance.pk
+    ).values_list('group', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def count_group_change(sender, instance, created, **kwargs):
+    """Переносит пост в счетчике групп, если группа сменилась."""
+    saved_group_id = getattr(instance, '_saved_group_id', instance.group_id)
+    if created or saved_group_id == instance.group_id:
+        return
+    counters.change('group.posts', saved_group_id, -1)
+    counters.change('group.posts', instance.group_id, 1)
+    instance._saved_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Post)
+def deliver_post(sender, instance, created, **kwargs):
+    """Рассылает новый пост по лентам подписчиков."""
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline(sender, instance, created, **kwargs):
+    """Заполняет ленту нового подписчика постами автора."""
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    """Очищает ленту от постов автора после отписки."""
+    timeline.prune(instance.user_id, instance.author_id)
+    timeline.resume_fan_out(instance.author_id)
+
+
+# Кэш сбрасывается после фиксации транзакции: иначе параллельный запрос
+# успел бы сохранить страницу без изменений под новой версией тегов.
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_posts(sender, **kwargs):
+    """Сбрасывает кэш лент при изменении поста."""
+    transaction.on_commit(lambda: bump('posts'))
+
+
+@receiver([post_save, post_delete], sender=Group)
+def invalidate_groups(sender, **kwargs):
+    """Сбрасывает кэш лент при изменении группы."""
+    transaction.on_commit(lambda: bump('groups'))
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def invalidate_follows(sender, instance, **kwargs):
+    """Сбрасывает валидаторы профиля автора и ленты подписчика."""
+    tags = (f'user:{instance.user_id}', f'user:{instance.author_id}')
+    transaction.on_commit(lambda: bump(*tags))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comments(sender, **kwargs):
+    """Сбрасывает кэш страниц с комментариями."""
+    transaction.on_commit(lambda: bump('comments'))
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Group)
+def remember_lookup(sender, instance, update_fields=None, **kwargs):
+    """Запоминает прежний username или slug, чтобы забыть его в кэше."""
+    instance._saved_lookup = lookups.saved_value(instance, update_fields)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+def forget_lookup(sender, instance, **kwargs):
+    """Удаляет объект и ненайденное имя из кэша поисков."""
+    lookups.forget(instance, getattr(instance, '_saved_lookup', None))
@@ -0,0 +1,18 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/picture.html')
+def responsive_image(image, size, css_class=''):
+    """<picture> с вариантами изображения поста для размера size.
+
+    Пока варианты не созданы, выводится исходное изображение.
+    """
+    return {
+        'image': image,
+        'picture': thumbnails.responsive_image(image, size),
+        'css_class': css_class,
+    }
@@ -0,0 +1,114 @@
+import json
+import os
+import random
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count
+from django.test import TestCase, TransactionTestCase
+
+from posts import benchmark
+from posts.models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'seed_benchmark_data', users=30, groups=3, posts=200,
+            comments=100, follows=5, images=0, stdout=StringIO()
+        )
+
+    def test_seed_creates_dataset(self):
+        """Генератор создает связанные данные со степенным распределением"""
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(Follow.objects.exists())
+        top = Post.objects.values('author').annotate(
+            count=Count('pk')
+        ).order_by('-count').first()
+        self.assertGreater(top['count'], 200 / 30)
+
+    def test_bench_views_saves_and_compares_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            call_command(
+                'bench_views', requests=3, warmup=1, save=path,
+                stdout=StringIO()
+            )
+            with open(path, encoding='utf-8') as file:
+                saved = json.load(file)
+            self.assertEqual(set(saved['results']), set(benchmark.SCENARIOS))
+            for summary in saved['results'].values():
+                self.assertEqual(summary['errors'], 0)
+                self.assertIsNotNone(summary['queries'])
+            stdout = StringIO()
+            call_command(
+                'bench_views', 'post_detail', requests=3, warmup=1,
+                baseline=path, tolerance=100, stdout=stdout,
+                stderr=StringIO()
+            )
+            self.assertIn('Регрессий нет', stdout.getvalue())
+
+    def test_feeds_are_opened_by_cursor(self):
+        """Ленты открываются по ?after=, номер страницы - свой сценарий"""
+        targets = benchmark.Targets(random.Random(0))
+        for name in ('index', 'group_posts', 'profile', 'follow_index'):
+            with self.subTest(name=name):
+                calls = [benchmark.SCENARIOS[name](targets) for _ in range(20)]
+                self.assertTrue(any('after' in call[2] for call in calls))
+                self.assertFalse(any('page' in call[2] for call in calls))
+        _, _, data, _ = benchmark.SCENARIOS['index_numbered'](targets)
+        self.assertIn('page', data)
+
+    def test_compare_reports_regressions(self):
+        baseline = {'index': {'p95_ms': 10, 'queries': 2}}
+        self.assertEqual(
+            benchmark.compare({'index': {'p95_ms': 11, 'queries': 2}},
+                              baseline),
+            []
+        )
+        self.assertEqual(len(benchmark.compare(
+            {'index': {'p95_ms': 20, 'queries': 4}}, baseline
+        )), 2)
+
+    def test_percentile_interpolates(self):
+        self.assertEqual(benchmark.percentile([3, 1, 2], 50), 2)
+        self.assertAlmostEqual(benchmark.percentile([1, 2], 95), 1.95)
+        self.assertEqual(benchmark.percentile([7], 99), 7)
+
+    def test_unknown_scenario(self):
+        with self.assertRaises(CommandError):
+            call_command('bench_views', 'missing', stdout=StringIO())
+
+
+class SQLiteBenchmarkTests(TransactionTestCase):
+    # Копия базы снимается вне транзакции: backup не ждет ее конца.
+    def setUp(self):
+        call_command(
+            'seed_benchmark_data', users=10, groups=1, posts=50,
+            comments=0, follows=2, images=0, stdout=StringIO()
+        )
+
+    def test_bench_sqlite_compares_profiles(self):
+        """Замер чтения при записи выводит строку на профиль и писателей"""
+        stdout = StringIO()
+        call_command(
+            'bench_sqlite', readers=1, writers=1, seconds=0.2, stdout=stdout
+        )
+        rows = [line.split() for line in stdout.getvalue().splitlines()[1:]]
+        self.assertEqual(
+            [row[:2] for row in rows],
+            [['default', '0'], ['default', '1'], ['tuned', '0'],
+             ['tuned', '1']]
+        )
+        for row in rows:
+            self.assertGreater(float(row[2]), 0)
+        self.assertEqual(rows[-1][-1], '0')
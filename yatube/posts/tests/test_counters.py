@@ -0,0 +1,100 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import counters
+from posts.models import Comment, Counter, Follow, Group, Post
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание'
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_counters_follow_changes(self):
+        """Счетчики меняются при создании и удалении записей"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+        Post.objects.create(text='Второй пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            counters.of('user', self.author.pk),
+            {'posts': 2, 'followers': 1, 'following': 0}
+        )
+        self.assertEqual(counters.of('user', self.reader.pk)['following'], 1)
+        self.assertEqual(counters.of('group', self.group.pk), {'posts': 1})
+        self.assertEqual(counters.of('post', post.pk), {'comments': 1})
+        comment.delete()
+        follow.delete()
+        post.delete()
+        self.assertEqual(
+            counters.of('user', self.author.pk),
+            {'posts': 1, 'followers': 0, 'following': 0}
+        )
+        self.assertEqual(counters.of('group', self.group.pk), {'posts': 0})
+        self.assertEqual(counters.of('post', post.pk), {'comments': 0})
+
+    def test_group_change_moves_post(self):
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(counters.of('group', self.group.pk), {'posts': 0})
+        self.assertEqual(
+            counters.of('group', self.other_group.pk), {'posts': 1}
+        )
+
+    def test_pages_do_not_count_rows(self):
+        """Профиль и страница поста не выполняют COUNT"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        pages = {
+            reverse('posts:profile', args=(self.author.username,)):
+                'posts_count',
+            reverse('posts:post_detail', args=(post.pk,)): 'post_count',
+        }
+        for url, name in pages.items():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.context[name], 1)
+                for query in queries:
+                    self.assertNotIn('COUNT(', query['sql'])
+
+    def test_rebuild_repairs_drift(self):
+        Post.objects.create(text='Пост', author=self.author)
+        Counter.objects.filter(name='user.posts').update(value=10)
+        Counter.objects.create(name='group.posts', object_id=0, value=3)
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.assertIn('user.posts: исправлено 1', out.getvalue())
+        self.assertIn('group.posts: исправлено 1', out.getvalue())
+        self.assertEqual(counters.of('user', self.author.pk)['posts'], 1)
+        self.assertFalse(Counter.objects.filter(object_id=0).exists())
@@ -0,0 +1,116 @@
+import json
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import counters, importer, search
+from posts.export import export
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+PUB_DATE = datetime(2015, 3, 1, 12, 30, tzinfo=timezone.utc)
+
+
+class ImporterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+
+    def ndjson(self, *rows):
+        return StringIO(''.join(
+            json.dumps(row, ensure_ascii=False) + '\n' for row in rows
+        ))
+
+    def test_posts_keep_dates_and_resolve_names(self):
+        """Даты сохраняются, имена авторов и групп переводятся в id"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        stats = importer.load('posts', self.ndjson(
+            {
+                'id': 100, 'pub_date': PUB_DATE.isoformat(),
+                'author': 'author', 'group': 'test-slug',
+                'text': 'Старый пост про котиков',
+            },
+            {'id': 101, 'author_id': self.author.pk, 'text': 'Без группы'},
+            {'id': 102, 'author': 'nobody', 'text': 'Неизвестный автор'},
+            {'id': 103, 'author': 'author', 'group': 'missing', 'text': '-'},
+        ))
+        self.assertEqual((stats['rows'], stats['skipped']), (2, 2))
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.pub_date, PUB_DATE)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.image, '')
+        self.assertIsNone(Post.objects.get(pk=101).group)
+        self.assertEqual(counters.of('user', self.author.pk)['posts'], 2)
+        self.assertEqual(counters.of('group', self.group.pk)['posts'], 1)
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('user', 'post')),
+            {(self.reader.pk, 100), (self.reader.pk, 101)}
+        )
+        self.assertEqual(search.search('котик', 10)[0], [post])
+
+    def test_repeated_load_skips_existing_rows(self):
+        """Повторная загрузка не считает и не доставляет старые строки"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        rows = [{'id': 200, 'author': 'author', 'text': 'Пост'}]
+        importer.load('posts', self.ndjson(*rows))
+        TimelineEntry.objects.all().delete()
+        stats = importer.load('posts', self.ndjson(
+            *rows, {'id': 202, 'author': 'author', 'text': 'Новый'}
+        ))
+        self.assertEqual((stats['rows'], stats['skipped']), (1, 1))
+        self.assertEqual(stats['ids'], [(202, 202)])
+        self.assertEqual(Post.objects.filter(pk=200).count(), 1)
+        self.assertEqual(counters.of('user', self.author.pk)['posts'], 2)
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('post', flat=True)),
+            [202]
+        )
+
+    def test_repeated_follow_is_skipped(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        stats = importer.load('follows', self.ndjson(
+            {'user': 'reader', 'author': 'author'},
+        ))
+        self.assertEqual((stats['rows'], stats['skipped']), (0, 1))
+        self.assertEqual(stats['ids'], [])
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_export_round_trip(self):
+        """Выгрузка загружается обратно без изменений"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='Ответ')
+        exported = ''.join(export('comments', 'csv'))
+        Comment.objects.all().delete()
+        importer.load('comments', StringIO(exported), 'csv')
+        self.assertEqual(''.join(export('comments', 'csv')), exported)
+        self.assertEqual(counters.of('post', post.pk)['comments'], 1)
+
+    def test_command_loads_follows_from_csv(self):
+        stream = StringIO(
+            'user,author\n'
+            'reader,author\n'
+            'author,author\n'
+            'reader,nobody\n'
+        )
+        stderr = StringIO()
+        call_command(
+            'import_content', 'follows', '--format', 'csv',
+            stdin=stream, stdout=StringIO(), stderr=stderr
+        )
+        self.assertEqual(
+            list(Follow.objects.values_list('user', 'author')),
+            [(self.reader.pk, self.author.pk)]
+        )
+        self.assertIn('строк/с', stderr.getvalue())
+        self.assertEqual(counters.of('user', self.author.pk)['followers'], 1)
@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import Http404
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import db_router
+from posts import lookups
+from posts.models import Group
+
+User = get_user_model()
+
+
+class LookupsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hit_costs_no_query(self):
+        self.assertEqual(lookups.user_or_404('author'), self.author)
+        self.assertEqual(lookups.group_or_404('test-slug'), self.group)
+        with self.assertNumQueries(0):
+            self.assertEqual(lookups.user_or_404('author'), self.author)
+            self.assertEqual(lookups.group_or_404('test-slug'), self.group)
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_miss_is_read_from_primary(self):
+        """Промах кэша читается из default, даже при чтении с реплики"""
+        # Запрос к replica1, не объявленной в databases, провалил бы тест.
+        with db_router.use_replica('replica1'):
+            self.assertEqual(lookups.user_or_404('author'), self.author)
+
+    def test_unknown_name_is_cached(self):
+        """Ненайденное имя не ищется в базе повторно до создания"""
+        with self.assertRaises(Http404):
+            lookups.user_or_404('newcomer')
+        with self.assertNumQueries(0), self.assertRaises(Http404):
+            lookups.user_or_404('newcomer')
+        newcomer = User.objects.create_user(username='newcomer')
+        self.assertEqual(lookups.user_or_404('newcomer'), newcomer)
+
+    def test_changes_are_not_served_from_cache(self):
+        user = User.objects.create_user(username='user')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Тестовое описание'
+        )
+        lookups.user_or_404('user')
+        lookups.group_or_404('group')
+        user.username = 'renamed'
+        user.save()
+        with self.assertRaises(Http404):
+            lookups.user_or_404('user')
+        self.assertEqual(lookups.user_or_404('renamed').pk, user.pk)
+        group.title = 'Новое название'
+        group.save()
+        self.assertEqual(lookups.group_or_404('group').title, group.title)
+        group.delete()
+        with self.assertRaises(Http404):
+            lookups.group_or_404('group')
+
+    def test_unknown_profile_is_404(self):
+        response = Client().get(
+            reverse('posts:profile', kwargs={'username': 'nobody'})
+        )
+        self.assertEqual(response.status_code, 404)
@@ -1,4 +1,7 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 from ..models import Group, Post
 import shutil
@@ -75,3 +78,11 @@ class PostModelTest(TestCase):
         for value, expected in value_expected.items():
             with self.subTest(value=value):
                 self.assertEqual(value, expected)
+
+
+class QueryPlanTest(TestCase):
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент не читают всю таблицу и не сортируют в памяти"""
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertNotIn('FAIL', out.getvalue())
@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post
+from posts.search import match_expression, search
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.relevant = Post.objects.create(
+            text='Котики, котики и снова котики',
+            author=cls.author
+        )
+        cls.other = Post.objects.create(
+            text='Длинный пост про собак, в конце которого есть котики',
+            author=cls.author
+        )
+        Post.objects.create(text='Пост про погоду', author=cls.author)
+
+    def setUp(self):
+        self.guest = Client()
+
+    def test_search_ranks_by_relevance(self):
+        """Результаты упорядочены по bm25"""
+        posts, next_cursor = search('котики', 10)
+        self.assertEqual(posts, [self.relevant, self.other])
+        self.assertIsNone(next_cursor)
+
+    def test_prefix_and_case(self):
+        posts, _ = search('КОТ', 10)
+        self.assertEqual(len(posts), 2)
+
+    def test_query_syntax_is_not_passed_to_fts(self):
+        """Спецсимволы FTS5 во вводе не ломают запрос"""
+        self.assertEqual(match_expression('"котики AND (собаки'),
+                         '"котики" "AND" "собаки"*')
+        self.assertEqual(search('" * ()', 10), ([], None))
+
+    def test_cursor_pages(self):
+        first, next_cursor = search('котики', 1)
+        second, last_cursor = search('котики', 1, after=next_cursor)
+        self.assertEqual(first + second, [self.relevant, self.other])
+        self.assertIsNone(last_cursor)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении поста"""
+        post = Post.objects.create(text='Редкое слово', author=self.author)
+        self.assertEqual(search('редкое', 10)[0], [post])
+        post.text = 'Другой текст'
+        post.save()
+        self.assertEqual(search('редкое', 10)[0], [])
+        self.assertEqual(search('другой', 10)[0], [post])
+        post.delete()
+        self.assertEqual(search('другой', 10)[0], [])
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        Post.objects.create(
+            text='<script>alert(1)</script> опасный пост',
+            author=self.author
+        )
+        response = self.guest.get(reverse('posts:search'), {'q': 'опасный'})
+        content = response.content.decode()
+        self.assertIn('<mark>опасный</mark>', content)
+        self.assertNotIn('<script>', content)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собак'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.other]
+        )
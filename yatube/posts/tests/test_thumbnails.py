@@ -0,0 +1,103 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from posts.thumbnails import (
+    IMAGE_SIZES, _build_manifest, ready_thumbnail, responsive_image,
+    variants
+)
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailPregenerationTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, name):
+        return SimpleUploadedFile(
+            name=name, content=SMALL_GIF, content_type='image/gif'
+        )
+
+    def test_post_create_pregenerates_thumbnails(self):
+        """После публикации поста все миниатюры уже созданы"""
+        self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': self.upload('a.gif')}
+        )
+        post = Post.objects.get()
+        for size in IMAGE_SIZES:
+            for geometry, options in variants(size):
+                with self.subTest(size=size, geometry=geometry):
+                    self.assertIsNotNone(
+                        ready_thumbnail(post.image, geometry, options)
+                    )
+        content = self.client.get(reverse('posts:index')).content.decode()
+        self.assertNotIn(post.image.url, content)
+        self.assertIn('srcset=', content)
+
+    def test_original_is_shown_until_thumbnail_is_ready(self):
+        """Пока миниатюры нет, выводится исходное изображение"""
+        post = Post.objects.create(
+            text='Пост без миниатюры',
+            author=self.user,
+            image=self.upload('b.gif')
+        )
+        content = self.client.get(reverse('posts:index')).content.decode()
+        self.assertIn(f'src="{post.image.url}"', content)
+        # Без фонового пула варианты создаются сразу после запроса.
+        self.assertIsNotNone(responsive_image(post.image, 'feed'))
+        # Страница с оригиналом не остается в кэше.
+        content = self.client.get(reverse('posts:index')).content.decode()
+        self.assertIn('srcset=', content)
+
+    def test_manifest_miss_costs_one_query(self):
+        """Хранилище sorl читается одним запросом на все варианты"""
+        post = Post.objects.create(
+            text='Пост с миниатюрами',
+            author=self.user,
+            image=self.upload('d.gif')
+        )
+        responsive_image(post.image, 'feed')
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(_build_manifest(post.image, 'feed'))
+
+    def test_small_images_are_not_upscaled(self):
+        """Маленький оригинал не растягивается: один вариант на формат"""
+        post = Post.objects.create(
+            text='Пост с маленькой картинкой',
+            author=self.user,
+            image=self.upload('c.gif')
+        )
+        responsive_image(post.image, 'detail')
+        picture = responsive_image(post.image, 'detail')
+        self.assertEqual(picture['srcset'].count(' 2w'), 1)
+        self.assertNotIn(',', picture['srcset'])
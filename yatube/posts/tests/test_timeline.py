@@ -0,0 +1,130 @@
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry
+from posts.tests.test_views import committed
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.PostAuthor = User.objects.create_user(username='PostAuthor')
+        cls.Follower = User.objects.create_user(username='Follower')
+        cls.post = Post.objects.create(
+            text='Пост до подписки',
+            author=cls.PostAuthor,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.follower = Client()
+        self.follower.force_login(self.Follower)
+
+    def follow(self):
+        self.follower.get(
+            reverse(
+                'posts:profile_follow',
+                kwargs={'username': self.PostAuthor.username}
+            )
+        )
+
+    def test_follow_backfills_timeline(self):
+        """Подписка копирует посты автора в ленту подписчика"""
+        self.follow()
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.Follower,
+                post=self.post
+            ).exists()
+        )
+
+    def test_new_post_fans_out(self):
+        """Новый пост доставляется в ленту подписчика"""
+        self.follow()
+        new_post = Post.objects.create(
+            text='Пост после подписки',
+            author=self.PostAuthor,
+        )
+        entry = TimelineEntry.objects.get(user=self.Follower, post=new_post)
+        self.assertEqual(entry.pub_date, new_post.pub_date)
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает посты автора из ленты"""
+        self.follow()
+        self.follower.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': self.PostAuthor.username}
+            )
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.Follower).exists()
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_is_pulled(self):
+        """Посты популярного автора не рассылаются, а читаются из ленты"""
+        self.follow()
+        new_post = Post.objects.create(
+            text='Пост популярного автора',
+            author=self.PostAuthor,
+        )
+        self.assertFalse(TimelineEntry.objects.filter(post=new_post).exists())
+        response = self.follower.get(reverse('posts:follow_index'))
+        self.assertIn(new_post, response.context['page_obj'])
+        self.assertIn(self.post, response.context['page_obj'])
+
+    def test_follow_created_directly(self):
+        """Подписка, созданная без представления, тоже заполняет ленту"""
+        Follow.objects.create(user=self.Follower, author=self.PostAuthor)
+        response = self.follower.get(reverse('posts:follow_index'))
+        self.assertIn(self.post, response.context['page_obj'])
+
+    def test_migration_backfills_existing_follows(self):
+        """Миграция заполняет ленты подписок, созданных до нее"""
+        Follow.objects.create(user=self.Follower, author=self.PostAuthor)
+        TimelineEntry.objects.all().delete()
+        migration = import_module('posts.migrations.0016_backfill_timeline')
+        # Редактор схемы SQLite не открывается внутри транзакции теста.
+        schema_editor = SimpleNamespace(connection=connection)
+        migration.backfill_timelines(apps, schema_editor)
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.Follower,
+                post=self.post
+            ).exists()
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_back_below_limit_is_delivered(self):
+        """Посты, вышедшие при pull, доставляются после отписки"""
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=other, author=self.PostAuthor)
+        self.follow()
+        pulled_post = Post.objects.create(
+            text='Пост при pull',
+            author=self.PostAuthor,
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.Follower).exists()
+        )
+        with committed():
+            Follow.objects.filter(user=other).delete()
+        self.assertEqual(
+            set(
+                TimelineEntry.objects.filter(
+                    user=self.Follower
+                ).values_list('post', flat=True)
+            ),
+            {self.post.pk, pulled_post.pk}
+        )
@@ -1,6 +1,7 @@
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
-from posts.models import Post, Group, Follow
+from posts.models import Comment, Post, Group, Follow
+from posts.views import COMMENTS_COUNT
 from django.urls import reverse
 from django import forms
 import shutil
@@ -9,9 +10,30 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from contextlib import contextmanager
+from core.cache import tag_versions
 
 User = get_user_model()
 
+
+@contextmanager
+def committed():
+    """Выполняет on_commit-колбэки блока: TestCase транзакцию не фиксирует.
+
+    Кэш лент сбрасывается только после фиксации (posts.signals).
+    """
+    start = len(connection.run_on_commit)
+    yield
+    callbacks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for _, callback in callbacks:
+        callback()
+
+
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
@@ -354,18 +376,59 @@ class PostsPagesTests(TestCase):
         """Тест кэширования главной страницы"""
         url = reverse('posts:index')
         response_first = self.guest.get(url)
-        empty_content = response_first.content
-        Post.objects.create(
-            text='Тествовый текст',
-            author=self.PostAuthor
-        )
-        response_second = self.guest.get(url)
-        cached_content = response_second.content
-        self.assertEqual(empty_content, cached_content)
-        cache.clear()
+        with self.assertNumQueries(0):
+            response_second = self.guest.get(url)
+        self.assertEqual(response_first.content, response_second.content)
+        with committed():
+            Post.objects.create(
+                text='Тествовый текст',
+                author=self.PostAuthor
+            )
         response_third = self.guest.get(url)
-        new_content = response_third.content
-        self.assertNotEqual(cached_content, new_content)
+        self.assertNotEqual(response_second.content, response_third.content)
+
+    def test_cache_index_invalidation(self):
+        """Кэш главной сбрасывается при изменении поста и группы"""
+        url = reverse('posts:index')
+        changes = {
+            'group': self.group.save,
+            'post': self.post.save,
+            'delete': lambda: Post.objects.create(
+                text='Удаляемый пост',
+                author=self.PostAuthor
+            ).delete(),
+        }
+        for change, apply_change in changes.items():
+            with self.subTest(change=change):
+                self.guest.get(url)
+                with committed():
+                    apply_change()
+                with self.assertTemplateUsed('posts/index.html'):
+                    self.guest.get(url)
+
+    def test_cache_is_invalidated_after_commit(self):
+        """Версии тегов меняются только после фиксации транзакции"""
+        before = tag_versions(('posts',))
+        with committed():
+            Post.objects.create(text='Новый пост', author=self.PostAuthor)
+            self.assertEqual(tag_versions(('posts',)), before)
+        self.assertNotEqual(tag_versions(('posts',)), before)
+
+    def test_form_render_takes_no_write_lock(self):
+        """GET формы не открывает транзакцию (BEGIN IMMEDIATE)"""
+        urls = (
+            reverse('posts:post_create'),
+            reverse('posts:post_edit', args=(self.post.pk,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.post_author.get(url)
+                self.assertFalse([
+                    query for query in queries
+                    if query['sql'].startswith('BEGIN')
+                    or query['sql'].startswith('SAVEPOINT')
+                ])
 
     def test_context_group_list(self):
         response = self.random_user.get(
@@ -458,3 +521,247 @@ class PaginatorViewsTest(TestCase):
             SECOND_PAGE_POST_COUNT,
             'Неправильное количество элементов на странице'
         )
+
+    def test_cursor_pages(self):
+        """Переход по курсорам ?after= и ?before= без пропусков и повторов"""
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        first_page = self.user.get(reverse('posts:index')).context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertIsNone(first_page.previous_cursor)
+        second_page = self.user.get(
+            reverse('posts:index') + f'?after={first_page.next_cursor}'
+        ).context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertIsNone(second_page.next_cursor)
+        self.assertFalse(set(first_page) & set(second_page))
+        previous_page = self.user.get(
+            reverse('posts:index') + f'?before={second_page.previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual(list(previous_page), list(first_page))
+
+    def test_broken_cursor_opens_first_page(self):
+        """Испорченный курсор открывает первую страницу"""
+        response = self.user.get(reverse('posts:index') + '?after=broken')
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_page_numbers_are_windowed(self):
+        """Число ссылок на страницы не растет вместе с лентой"""
+        paginator = Paginator(range(2000000), 10)
+        html = render_to_string(
+            'posts/includes/paginator.html',
+            {'page_obj': paginator.page(100000)}
+        )
+        self.assertLess(html.count('page-item'), 15)
+        for number in ('1', '99999', '100000', '100001', '200000'):
+            with self.subTest(number=number):
+                self.assertIn(f'>{number}<', html)
+
+
+class PersonalFragmentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.FirstUser = User.objects.create_user(username='FirstUser')
+        cls.SecondUser = User.objects.create_user(username='SecondUser')
+
+    def setUp(self):
+        cache.clear()
+        self.first = Client()
+        self.first.force_login(self.FirstUser)
+        self.second = Client()
+        self.second.force_login(self.SecondUser)
+
+    def test_cached_index_header_is_personal(self):
+        """Кэш главной общий, а шапка своя у каждого пользователя"""
+        url = reverse('posts:index')
+        first_content = self.first.get(url).content.decode()
+        with self.assertTemplateNotUsed('posts/index.html'):
+            second_response = self.second.get(url)
+        second_content = second_response.content.decode()
+        self.assertIn('FirstUser', first_content)
+        self.assertNotIn('FirstUser', second_content)
+        self.assertIn('SecondUser', second_content)
+        self.assertIn('Избранные авторы', second_content)
+        self.assertIn('private', second_response['Cache-Control'])
+        guest_content = Client().get(url).content.decode()
+        self.assertNotIn('SecondUser', guest_content)
+        self.assertNotIn('Избранные авторы', guest_content)
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов страницы ленты не зависит от числа постов"""
+    POSTS_NUM: int = 12
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Follower = User.objects.create_user(username='Follower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        for number in range(cls.POSTS_NUM):
+            author = User.objects.create_user(username=f'author_{number}')
+            Follow.objects.create(user=cls.Follower, author=author)
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=author,
+                group=cls.group if number % 2 else Group.objects.create(
+                    title=f'Группа {number}',
+                    slug=f'group-{number}',
+                    description='Тестовое описание'
+                )
+            )
+        cls.author = author
+
+    def setUp(self):
+        cache.clear()
+        self.follower = Client()
+        self.follower.force_login(self.Follower)
+
+    def test_feed_query_budget(self):
+        # Сессия и пользователь: 2 запроса на каждую страницу,
+        # дата новейшей записи для ETag: 1 запрос при пустом кэше.
+        query_budget = {
+            reverse('posts:index'): 4,
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': self.group.slug}
+            ): 5,
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.author.username}
+            ): 7,
+            reverse('posts:follow_index'): 6,
+        }
+        for url, budget in query_budget.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    self.follower.get(url)
+
+
+class CommentPagesTest(TestCase):
+    """Комментарии выводятся страницами по курсору"""
+    COMMENTS_NUM: int = 25
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        for number in range(cls.COMMENTS_NUM):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader_{number}'),
+                text=f'Комментарий {number}'
+            )
+
+    def setUp(self):
+        self.guest = Client()
+
+    def test_first_page_is_bounded(self):
+        """Запросов столько же, сколько при одном комментарии"""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        with self.assertNumQueries(5):
+            response = self.guest.get(url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_COUNT)
+        self.assertEqual(comments[0].text, 'Комментарий 24')
+        self.assertEqual(response.context['comments_count'], 25)
+        self.assertContains(response, 'data-more=')
+
+    def test_load_more_fragment(self):
+        first = self.guest.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        ).context['comments']
+        url = reverse('posts:post_comments', args=(self.post.pk,))
+        response = self.guest.get(url, {'after': first.next_cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertNotContains(response, '<html')
+        self.assertContains(response, 'Комментарий 0')
+        self.assertNotContains(response, 'Комментарий 20')
+        self.assertNotContains(response, 'data-more=')
+
+    def test_load_more_json(self):
+        first = self.guest.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        ).context['comments']
+        response = self.guest.get(
+            reverse('posts:post_comments', args=(self.post.pk,)),
+            {'after': first.next_cursor},
+            HTTP_ACCEPT='application/json'
+        )
+        data = response.json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            [f'Комментарий {number}' for number in range(4, -1, -1)]
+        )
+        self.assertEqual(data['comments'][0]['author'], 'reader_4')
+        self.assertIsNone(data['next_cursor'])
+
+
+class ConditionalGetTest(TestCase):
+    """Страницы отдают ETag и 304 без рендера шаблонов"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+            reverse('posts:follow_index'),
+        )
+        # Форма комментария выдает CSRF-cookie, от нее зависит ETag.
+        self.reader_client.get(self.urls[3])
+
+    def test_matching_etag_gets_304(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.reader_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.has_header('Last-Modified'))
+                repeated = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(repeated.status_code, 304)
+                self.assertEqual(repeated.content, b'')
+                self.assertIsNone(repeated.templates or None)
+
+    def test_etag_changes_with_content(self):
+        etags = {url: self.reader_client.get(url)['ETag'] for url in self.urls}
+        with committed():
+            Post.objects.create(text='Новый пост', author=self.author)
+            Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'
+            )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_is_personal(self):
+        url = reverse('posts:index')
+        etag = self.reader_client.get(url)['ETag']
+        response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,298 @@
+"""Адаптивные изображения постов, созданные заранее.
+
+Для каждого размера из IMAGE_SIZES создаются варианты нескольких
+ширин в форматах WebP (если Pillow собран с libwebp) и JPEG. Браузер
+выбирает подходящий вариант по srcset/sizes, поэтому телефон не
+загружает картинку шириной 1920 пикселей.
+
+Варианты создаются после сохранения поста в фоновом пуле потоков, и
+запрос страницы не тратит время на декодирование, масштабирование и
+сжатие. Пока варианты не готовы, шаблон выводит исходное изображение.
+Список готовых вариантов хранится в кэше (манифест); когда он
+сохранен, кэш лент сбрасывается, чтобы страницы, собранные с
+исходным изображением, не жили до истечения своего срока.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDbKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import metrics
+from core.cache import bump
+from core.queries import unchecked
+from core.instrumentation import timer
+
+logger = logging.getLogger(__name__)
+
+# Размеры изображений в шаблонах: ширины вариантов, рамка и sizes.
+IMAGE_SIZES = {
+    'feed': {
+        'widths': (480, 960, 1440),
+        'box': (960, 339),
+        'crop': True,
+        'sizes': '(min-width: 1200px) 1110px, 100vw',
+    },
+    'detail': {
+        'widths': (640, 1280, 1920),
+        'box': (1920, 1080),
+        'crop': False,
+        'sizes': '(min-width: 1200px) 825px, 75vw',
+    },
+}
+IMAGE_QUALITY = {'WEBP': 80, 'JPEG': 82}
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+WORKERS: int = 2
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+metrics.gauge('yatube_thumbnail_queue_depth', lambda: len(_pending))
+
+
+def image_formats():
+    """Форматы вариантов, от лучшего сжатия к самому совместимому."""
+    formats = ['WEBP'] if features.check('webp') else []
+    return formats + ['JPEG']
+
+
+def variants(size):
+    """Геометрия и опции sorl для каждого варианта размера size."""
+    spec = IMAGE_SIZES[size]
+    box_width, box_height = spec['box']
+    for format_ in image_formats():
+        for width in spec['widths']:
+            options = {
+                'format': format_,
+                'quality': IMAGE_QUALITY[format_],
+                'upscale': getattr(settings, 'POST_IMAGE_UPSCALE', False),
+            }
+            if spec['crop']:
+                options['crop'] = 'center'
+            height = round(width * box_height / box_width)
+            yield f'{width}x{height}', options
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'THUMBNAIL_WORKERS', WORKERS),
+                thread_name_prefix='thumbnails'
+            )
+    return _executor
+
+
+def _resolve_options(source, options):
+    """Опции с теми же значениями по умолчанию, что у sorl."""
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def _thumbnail_files(file_, specs) -> list:
+    """Файлы миниатюр [(geometry, options)] под именами, как у sorl."""
+    source = ImageFile(file_)
+    return [
+        ImageFile(
+            default.backend._get_thumbnail_filename(
+                source, geometry, _resolve_options(source, options)
+            ),
+            default.storage
+        )
+        for geometry, options in specs
+    ]
+
+
+def _stored(images) -> list:
+    """Записи хранилища sorl для миниатюр images; None - не создана.
+
+    Промахи кэша sorl читаются из базы одним запросом, а не запросом на
+    каждую миниатюру.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDbKVStore):
+        return [kvstore.get(image) for image in images]
+    keys = [add_prefix(image.key) for image in images]
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        stored = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        # Как sorl: отсутствие тоже кэшируется, чтобы не искать снова.
+        found = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    return [
+        None if values[key] == EMPTY_VALUE or not values[key]
+        else deserialize_image_file(values[key])
+        for key in keys
+    ]
+
+
+def ready_thumbnail(file_, geometry, options):
+    """Готовая миниатюра из хранилища sorl или None, не создавая ее."""
+    return _stored(_thumbnail_files(file_, [(geometry, options)]))[0]
+
+
+def _manifest_key(name, size):
+    return f'post_image:{size}:{name}'
+
+
+def _manifest(thumbnails, specs, size):
+    """Варианты изображения, сгруппированные по формату.
+
+    Возвращает None, если хотя бы один вариант еще не создан.
+    """
+    sources = {}
+    for thumbnail, (_, options) in zip(thumbnails, specs):
+        if not thumbnail or not thumbnail.width:
+            return None
+        candidates = sources.setdefault(options['format'], {})
+        candidates.setdefault(thumbnail.width, thumbnail.url)
+    formats = [
+        {
+            'type': MIME_TYPES[format_],
+            'srcset': ', '.join(
+                f'{url} {width}w' for width, url in sorted(candidates.items())
+            ),
+        }
+        for format_, candidates in sources.items()
+    ]
+    fallback = sources['JPEG']
+    return {
+        'sources': formats[:-1],
+        'srcset': formats[-1]['srcset'],
+        'src': fallback[sorted(fallback)[len(fallback) // 2]],
+        'sizes': IMAGE_SIZES[size]['sizes'],
+    }
+
+
+def _build_manifest(file_, size, create=False):
+    """Манифест готовых вариантов изображения или None."""
+    specs = list(variants(size))
+    with timer('thumbnail'):
+        if create:
+            thumbnails = [
+                default.backend.get_thumbnail(file_, geometry, **options)
+                for geometry, options in specs
+            ]
+        else:
+            thumbnails = _stored(_thumbnail_files(file_, specs))
+    return _manifest(thumbnails, specs, size)
+
+
+def prefetch(posts, size):
+    """Манифесты изображений постов страницы одним запросом к sorl.
+
+    После этого responsive_image не обращается к базе: готовые манифесты
+    лежат в кэше, а для остальных в кэше sorl отмечены пропуски.
+    """
+    images = {
+        _manifest_key(post.image.name, size): post.image
+        for post in posts if post.image
+    }
+    cached = cache.get_many(images)
+    missing = [
+        image for key, image in images.items() if key not in cached
+    ]
+    if not missing:
+        return
+    specs = list(variants(size))
+    try:
+        with timer('thumbnail'):
+            thumbnails = _stored([
+                thumbnail
+                for image in missing
+                for thumbnail in _thumbnail_files(image, specs)
+            ])
+    except Exception:
+        logger.exception('Не удалось найти варианты изображений')
+        return
+    manifests = {}
+    for number, image in enumerate(missing):
+        start = number * len(specs)
+        manifest = _manifest(thumbnails[start:start + len(specs)], specs, size)
+        if manifest:
+            manifests[_manifest_key(image.name, size)] = manifest
+    cache.set_many(manifests, None)
+
+
+def _generate(name, size):
+    try:
+        # Без пула потоков создание идет в запросе; sorl пишет хранилище
+        # по ключу на вариант, и детектор N+1 это не касается.
+        with unchecked():
+            manifest = _build_manifest(name, size, create=True)
+        if manifest:
+            cache.set(_manifest_key(name, size), manifest, None)
+            bump('posts')
+    except Exception:
+        logger.exception('Не удалось создать варианты изображения %s', name)
+    finally:
+        with _lock:
+            _pending.discard((name, size))
+        close_old_connections()
+
+
+def _submit(name, size):
+    with _lock:
+        if (name, size) in _pending:
+            return
+        _pending.add((name, size))
+    if getattr(settings, 'THUMBNAIL_WORKERS', WORKERS):
+        _get_executor().submit(_generate, name, size)
+    else:
+        _generate(name, size)
+
+
+def pregenerate(image, sizes=None):
+    """Ставит в очередь создание вариантов изображения после коммита."""
+    if not image:
+        return
+    name = image.name
+    for size in sizes or IMAGE_SIZES:
+        transaction.on_commit(lambda size=size: _submit(name, size))
+
+
+def responsive_image(image, size):
+    """Манифест готовых вариантов или None, если их еще нет.
+
+    Если вариантов нет, их создание ставится в очередь.
+    """
+    key = _manifest_key(image.name, size)
+    manifest = cache.get(key)
+    if manifest is None:
+        try:
+            manifest = _build_manifest(image, size)
+        except Exception:
+            logger.exception('Не удалось найти варианты %s', image.name)
+        if manifest is None:
+            pregenerate(image, [size])
+            return None
+        cache.set(key, manifest, None)
+    return manifest
@@ -0,0 +1,178 @@
+"""Лента подписок с доставкой постов при публикации (fan-out on write).
+
+Новый пост сразу записывается во «входящие» (TimelineEntry) каждого
+подписчика, поэтому страница подписок читает один диапазон индекса
+(user, pub_date) вместо соединения Follow и Post.
+
+Для авторов, у которых подписчиков больше TIMELINE_FANOUT_LIMIT,
+рассылка не выполняется: их посты подтягиваются при чтении ленты
+(pull), чтобы один пост не порождал миллион строк. Когда после отписок
+подписчиков снова не больше порога, пропущенные посты доставляются
+(resume_fan_out).
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core.paginator import get_page
+
+from . import counters
+from .models import FEED_FIELDS, Counter, Follow, Post, TimelineEntry
+
+FANOUT_LIMIT: int = 1000  # подписчиков, после которых включается pull
+BACKFILL_LIMIT: int = 1000  # постов автора, копируемых при подписке
+BATCH_SIZE: int = 500
+
+
+def _fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', FANOUT_LIMIT)
+
+
+def followers_counts(author_ids) -> dict:
+    """Число подписчиков авторов."""
+    return counters.get('user.followers', author_ids)
+
+
+def is_pulled(author_id) -> bool:
+    """Посты автора читаются при открытии ленты, а не рассылаются."""
+    return followers_counts([author_id])[author_id] > _fanout_limit()
+
+
+def pulled_authors(user):
+    """Авторы из подписок пользователя, чьи посты не рассылаются."""
+    author_ids = list(
+        Follow.objects.filter(user=user).values_list('author', flat=True)
+    )
+    limit = _fanout_limit()
+    return [
+        author_id
+        for author_id, count in followers_counts(author_ids).items()
+        if count > limit
+    ]
+
+
+def _insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out(post):
+    """Доставляет новый пост во входящие подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user', flat=True)
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for user_id in follower_ids.iterator()
+    )
+
+
+def backfill(user_id, author_id):
+    """Копирует последние посты автора в ленту нового подписчика."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )[:getattr(settings, 'TIMELINE_BACKFILL_LIMIT', BACKFILL_LIMIT)]
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    )
+
+
+def _deliver(condition, params):
+    """INSERT ... SELECT пар (подписчик, пост) по условию condition.
+
+    Уже доставленные пары пропускаются, посты pull-авторов тоже. Строки
+    идут в порядке индекса (user, pub_date), так вставка почти в полтора
+    раза быстрее, чем вразброс.
+    """
+    ops = connection.ops
+    sql = (
+        f'{ops.insert_statement(ignore_conflicts=True)} '
+        f'{TimelineEntry._meta.db_table} (user_id, post_id, pub_date) '
+        f'SELECT f.user_id, p.id, p.pub_date '
+        f'FROM {Follow._meta.db_table} f '
+        f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+        f'WHERE {condition} AND f.author_id NOT IN ('
+        f'SELECT object_id FROM {Counter._meta.db_table} '
+        f'WHERE name = %s AND value > %s) '
+        f'ORDER BY f.user_id, p.pub_date'
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, 'user.followers', _fanout_limit()])
+
+
+def deliver_imported(post_ids=None, follow_ids=None):
+    """Входящие для постов и подписок, загруженных в обход сигналов.
+
+    post_ids и follow_ids - диапазоны (первый id, последний id);
+    ограничение TIMELINE_BACKFILL_LIMIT не применяется.
+    """
+    for column, ids in (('p.id', post_ids), ('f.id', follow_ids)):
+        if ids:
+            _deliver(f'{column} BETWEEN %s AND %s', ids)
+
+
+def deliver_author(author_id):
+    """Входящие всех подписчиков автора, который перестал быть pull.
+
+    Пока подписчиков было больше порога, его посты не рассылались, а
+    новые подписки не заполнялись; теперь каждый подписчик получает
+    последние TIMELINE_BACKFILL_LIMIT постов автора.
+    """
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values('pk')[:getattr(
+        settings, 'TIMELINE_BACKFILL_LIMIT', BACKFILL_LIMIT
+    )]
+    posts_sql, posts_params = posts.query.sql_with_params()
+    _deliver(
+        f'f.author_id = %s AND p.id IN ({posts_sql})',
+        [author_id, *posts_params]
+    )
+
+
+def resume_fan_out(author_id):
+    """Доставляет посты автора, вернувшегося к рассылке после отписки.
+
+    Автор возвращается, когда подписчиков становится ровно
+    TIMELINE_FANOUT_LIMIT.
+    """
+    if followers_counts([author_id])[author_id] != _fanout_limit():
+        return
+    # После фиксации: при удалении автора его посты к этому моменту уже
+    # удалены и не попадут во входящие.
+    transaction.on_commit(lambda: deliver_author(author_id))
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def feed_page(request, user, per_page):
+    """Страница ленты подписок пользователя.
+
+    Входящие читаются по индексу (user, pub_date, post) и превращаются
+    в посты; посты pull-авторов добавляются запросом к Post.
+    """
+    pulled = pulled_authors(user)
+    if pulled:
+        inbox = TimelineEntry.objects.filter(user=user).values('post')
+        posts = Post.objects.filter(Q(pk__in=inbox) | Q(author__in=pulled))
+        return get_page(request, posts.for_feed(), per_page)
+    entries = TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group'
+    ).only('pub_date', 'post', *(f'post__{field}' for field in FEED_FIELDS))
+    return get_page(
+        request, entries, per_page,
+        key=('pub_date', 'post_id'),
+        transform=lambda rows: [entry.post for entry in rows],
+    )
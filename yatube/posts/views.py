@@ -1,27 +1,79 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Post, Group, Follow
-from django.core.paginator import Paginator
-from django.contrib.auth import get_user_model
+from .models import Comment, Post, Group, Follow
+from . import counters, lookups, search as post_search, thumbnails, timeline
+from core.paginator import CursorPaginator, get_page
 from .forms import PostForm, CommentForm
 from django.core.cache import cache
+from django.db import transaction
+from django.http import JsonResponse
 from django.core.cache.utils import make_template_fragment_key
-from django.views.decorators.cache import cache_page
-
-User = get_user_model()
+from core.cache import (
+    cache_page_tagged, conditional_tagged, with_personal_fragments
+)
 
 POSTS_COUNT: int = 10
+COMMENTS_COUNT: int = 20
+INDEX_CACHE_TIMEOUT: int = getattr(settings, 'PAGE_CACHE_TIMEOUT', 20)
+FEED_TAGS = ('posts', 'groups')  # теги кэша, от которых зависят ленты
+
+
+def latest_pub_date(queryset):
+    """Дата самой новой записи (по индексу) или None."""
+    return queryset.order_by('-pub_date').values_list(
+        'pub_date', flat=True
+    ).first()
+
+
+def feed_tags(request, *args, **kwargs):
+    return FEED_TAGS
+
+
+def latest_post(request):
+    return latest_pub_date(Post.objects.all())
+
+
+def latest_group_post(request, slug):
+    return latest_pub_date(lookups.group_or_404(slug).posts.all())
+
+
+def profile_tags(request, username):
+    return (*FEED_TAGS, f'user:{lookups.user_or_404(username).pk}')
+
+
+def latest_author_post(request, username):
+    return latest_pub_date(lookups.user_or_404(username).posts.all())
+
+
+def post_tags(request, post_id):
+    return (*FEED_TAGS, 'comments')
+
+
+def latest_comment(request, post_id):
+    return latest_pub_date(
+        Comment.objects.filter(post_id=post_id)
+    ) or latest_pub_date(Post.objects.filter(pk=post_id))
+
+
+def follow_tags(request):
+    return (*FEED_TAGS, f'user:{request.user.pk}')
+
+
+def latest_timeline_entry(request):
+    return latest_pub_date(request.user.timeline.all())
 
 
-@cache_page(20, key_prefix='index_posts')
+@conditional_tagged(feed_tags, latest_post)
+@with_personal_fragments
+@cache_page_tagged(INDEX_CACHE_TIMEOUT, FEED_TAGS, key_prefix='index_posts')
 def index(request):
     """Функция обработки запроса к главной странице"""
 
     template = 'posts/index.html'
-    posts = Post.objects.select_related()
-    paginator = Paginator(posts, POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.for_feed()
+    page_obj = get_page(request, posts, POSTS_COUNT)
+    thumbnails.prefetch(page_obj, 'feed')
 
     context = {
         'page_obj': page_obj,
@@ -30,15 +82,15 @@ def index(request):
     return render(request, template, context)
 
 
+@conditional_tagged(feed_tags, latest_group_post)
 def group_posts(request, slug):
     """Функция обработки запроса к странице группы"""
 
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('group')
-    paginator = Paginator(posts, POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    group = lookups.group_or_404(slug)
+    posts = group.posts.for_feed()
+    page_obj = get_page(request, posts, POSTS_COUNT)
+    thumbnails.prefetch(page_obj, 'feed')
 
     context = {
         'group': group,
@@ -47,16 +99,16 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@conditional_tagged(profile_tags, latest_author_post)
 def profile(request, username):
     """Функция обработки запроса к странице пользователя"""
 
     template = 'posts/profile.html'
-    author = User.objects.get(username=username)
-    posts = author.posts.select_related('author')
-    paginator = Paginator(posts, POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    posts_count = paginator.count
+    author = lookups.user_or_404(username)
+    posts = author.posts.for_feed()
+    page_obj = get_page(request, posts, POSTS_COUNT)
+    thumbnails.prefetch(page_obj, 'feed')
+    author_counters = counters.of('user', author.pk)
     following = (
         request.user.is_authenticated
         and Follow.objects.filter(user=request.user, author=author).exists()
@@ -64,7 +116,9 @@ def profile(request, username):
 
     context = {
         'page_obj': page_obj,
-        'posts_count': posts_count,
+        'posts_count': author_counters['posts'],
+        'followers_count': author_counters['followers'],
+        'following_count': author_counters['following'],
         'author': author,
         'following': following,
         'username': request.user,
@@ -72,22 +126,78 @@ def profile(request, username):
     return render(request, template, context)
 
 
+@conditional_tagged(post_tags, latest_comment)
 def post_detail(request, post_id):
     """Функция обработки запроса к странице поста"""
 
     template = 'posts/post_detail.html'
-    post = Post.objects.get(pk=post_id)
-    author = User.objects.get(username=post.author)
-    post_count = author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
+    post_count = counters.of('user', post.author_id)['posts']
     context = {
         'form': CommentForm(request.POST or None),
-        'comments': post.comments.select_related('post'),
+        'comments': comment_page(request, post),
+        'comments_count': counters.of('post', post.pk)['comments'],
         'post': post,
         'post_count': post_count,
     }
     return render(request, template, context)
 
 
+def comment_page(request, post):
+    """Страница комментариев поста по курсору ?after= или ?before=."""
+    comments = post.comments.select_related('author').only(
+        'text', 'pub_date', 'post', 'author', 'author__username',
+        'author__first_name', 'author__last_name',
+    )
+    return CursorPaginator(comments, COMMENTS_COUNT).get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
+
+def post_comments(request, post_id):
+    """Функция обработки запроса к следующей странице комментариев"""
+
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    page_obj = comment_page(request, post)
+    if 'application/json' in request.META.get('HTTP_ACCEPT', ''):
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'pub_date': comment.pub_date.isoformat(),
+                }
+                for comment in page_obj
+            ],
+            'next_cursor': page_obj.next_cursor,
+        })
+    context = {
+        'comments': page_obj,
+        'post': post,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def search(request):
+    """Функция обработки запроса к странице поиска"""
+
+    template = 'posts/search.html'
+    query = request.GET.get('q', '')
+    posts, next_cursor = post_search.search(
+        query, POSTS_COUNT, after=request.GET.get('after')
+    )
+    context = {
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
+    }
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request):
     """Функция обработки запроса к странице создания поста"""
@@ -96,7 +206,11 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        # Только запись в транзакции: с BEGIN IMMEDIATE она держит
+        # блокировку записи SQLite, рендер формы ее не берет.
+        with transaction.atomic():
+            post.save()
+        thumbnails.pregenerate(post.image)
         return redirect('posts:profile', post.author.username)
     form = PostForm()
     context = {
@@ -123,7 +237,9 @@ def post_edit(request, post_id):
             files=request.FILES or None
         )
         if form.is_valid():
-            post.save()
+            with transaction.atomic():
+                post.save()
+            thumbnails.pregenerate(post.image)
             return redirect('posts:post_detail', post_id)
         return render(request, 'posts/create_post.html', {'form': form})
     form = PostForm(instance=post)
@@ -144,22 +260,19 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@conditional_tagged(follow_tags, latest_timeline_entry)
 def follow_index(request):
     """Функция обработки запроса к странице подписок"""
 
     template = 'posts/follow.html'
-    follower = User.objects.get(username=request.user)
-    posts = Post.objects.filter(
-        author__following__user=follower
-    )
-    paginator = Paginator(posts, POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = timeline.feed_page(request, request.user, POSTS_COUNT)
+    thumbnails.prefetch(page_obj, 'feed')
 
     context = {
         'page_obj': page_obj,
@@ -168,11 +281,12 @@ def follow_index(request):
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     """Функция обработки запроса на подписку"""
 
-    user = User.objects.get(username=request.user)
-    author = User.objects.get(username=username)
+    user = request.user
+    author = lookups.user_or_404(username)
     if author != user:
         Follow.objects.get_or_create(
             user=user,
@@ -183,11 +297,12 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     """Функция обработки запроса на отписку"""
 
-    user = User.objects.get(username=request.user)
-    author = User.objects.get(username=username)
+    user = request.user
+    author = lookups.user_or_404(username)
     Follow.objects.filter(
         user=user,
         author=author,
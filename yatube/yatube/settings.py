@@ -50,11 +50,57 @@ ALLOWED_HOSTS = [
 ]
 
 # Кэширование
-CACHES = {
-    'default': {
+# Профиль выбирается переменной окружения YATUBE_CACHE:
+# locmem - память процесса, sqlite - общий файл для всех воркеров.
+CACHE_PROFILES = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'sqlite': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+CACHE_PROFILE = os.getenv('YATUBE_CACHE', 'locmem')
+CACHES = {
+    'default': CACHE_PROFILES[CACHE_PROFILE],
 }
+# Срок кэша страниц с тегами (core.cache). Кэш locmem у каждого процесса
+# свой, и bump() в процессе, принявшем запись, остальные не видят: с ним
+# страница живет секунды, с общим кэшем - часы.
+PAGE_CACHE_TIMEOUT = 20 if CACHE_PROFILE == 'locmem' else 60 * 60 * 4
+
+# Лента подписок: рассылка постов подписчикам при публикации.
+# Посты авторов с большим числом подписчиков читаются при открытии ленты.
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_BACKFILL_LIMIT = 1000
+
+# Потоки для создания миниатюр после загрузки; 0 - создавать сразу.
+THUMBNAIL_WORKERS = 2
+
+# Замеры запросов (SQL, шаблоны, кэш, миниатюры): доля замеряемых
+# запросов, 0 - замеры выключены. Итог пишется в журнал
+# core.middleware и в заголовок Server-Timing.
+PERFORMANCE_SAMPLE_RATE = float(os.getenv('YATUBE_PERF_SAMPLE_RATE', 0))
+PERFORMANCE_SERVER_TIMING = DEBUG
+
+# Метрики Prometheus на /metrics. Процессы пишут снимки в METRICS_DIR.
+# Включены только в WSGI-сервере (yatube/wsgi.py): тесты и команды
+# manage.py файлов не пишут.
+METRICS_ENABLED = os.getenv('YATUBE_METRICS', '0') == '1'
+METRICS_DIR = os.getenv(
+    'YATUBE_METRICS_DIR', os.path.join(BASE_DIR, 'metrics')
+)
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Поиск N+1 (core.queries): 'warn', 'raise' или 'off'.
+QUERY_DETECTOR_MODE = os.getenv(
+    'YATUBE_QUERY_DETECTOR', 'warn' if DEBUG else 'off'
+)
+QUERY_DETECTOR_THRESHOLD = 3
 # Application definition
 
 INSTALLED_APPS = [
@@ -62,6 +108,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -72,6 +119,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.QueryDetectorMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -108,13 +159,52 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite в режиме WAL с PRAGMA из core.db_backends.sqlite3. Соединения
+# живут CONN_MAX_AGE секунд в каждом потоке и проверяются перед первым
+# обращением в запросе (CONN_HEALTH_CHECKS).
+CONN_MAX_AGE = int(os.getenv('YATUBE_CONN_MAX_AGE', 600))
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db_backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Реплики для чтения (core.db_router): копии db.sqlite3, которые обновляет
+# команда replicate_sqlite. Включаются переменной YATUBE_DB_REPLICAS=N;
+# replica1 объявлена всегда, чтобы маршрутизацию можно было тестировать.
+REPLICAS_COUNT = int(os.getenv('YATUBE_DB_REPLICAS', 0))
+for number in range(1, max(REPLICAS_COUNT, 1) + 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'core.db_backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.replica{number}.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pragmas': {'query_only': 'ON'},
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+DATABASE_REPLICAS = [
+    f'replica{number}' for number in range(1, REPLICAS_COUNT + 1)
+]
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+REPLICA_VIEWS = [
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+]
+REPLICA_PIN_COOKIE = 'use_primary'
+REPLICA_STICKY_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -151,3 +241,20 @@ USE_I18N = True
 USE_L10N = True
 
 USE_TZ = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.middleware': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
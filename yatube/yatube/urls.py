@@ -18,6 +18,8 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import metrics
+
 handler500 = 'core.views.internal_server_error'
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
@@ -28,6 +30,8 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/', include('api.urls', namespace='api')),
+    path('metrics', metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
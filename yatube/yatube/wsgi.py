@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+# Метрики собирает только сервер; YATUBE_METRICS=0 их выключает.
+os.environ.setdefault('YATUBE_METRICS', '1')
 
 application = get_wsgi_application()